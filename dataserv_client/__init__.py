@@ -1 +1,8 @@
-from .version import __version__  # NOQA
+import sys
+if sys.version_info[0] == 2:  # python 3 already has the new module names
+    from future.standard_library import install_aliases
+    install_aliases()
+
+# modules import slow or rarely used dependencies in the functions that
+# need them, to keep the cli startup fast
+from .version import __version__  # NOQA
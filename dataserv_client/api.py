@@ -1,25 +1,18 @@
 #!/usr/bin/env python3
 
-from future.standard_library import install_aliases
-install_aliases()
-
-import datetime
 import os
-import time
-import socket
-import urllib
-import urllib.error
-import urllib.request
+import signal
+import threading
 
-from http.client import HTTPException
 from dataserv_client import __version__
-from dataserv_client import builder
+from dataserv_client import cache
 from dataserv_client import common
+from dataserv_client import connection
 from dataserv_client import deserialize
 from dataserv_client import exceptions
-
-_timedelta = datetime.timedelta
-_now = datetime.datetime.now
+from dataserv_client import metrics
+from dataserv_client import schedule
+from dataserv_client import throttle
 
 
 class Client(object):
@@ -27,24 +20,72 @@ class Client(object):
     def __init__(self, address=None, url=common.DEFAULT_URL, debug=False,
                  max_size=common.DEFAULT_MAX_SIZE,
                  store_path=common.DEFAULT_STORE_PATH,
+                 min_free_size=common.DEFAULT_MIN_FREE_SIZE,
+                 max_io_rate=None, nice=None, ionice=None,
                  connection_retry_limit=common.DEFAULT_CONNECTION_RETRY_LIMIT,
-                 connection_retry_delay=common.DEFAULT_CONNECTION_RETRY_DELAY):
+                 connection_retry_delay=common.DEFAULT_CONNECTION_RETRY_DELAY,
+                 metrics_port=None, status_file=None,
+                 shard_size=common.SHARD_SIZE, workers=common.DEFAULT_WORKERS,
+                 audit_cache_dir=common.DEFAULT_AUDIT_CACHE_DIR):
 
         self.url = url
         self.debug = debug
         self.address = address
-        self.max_size = deserialize.byte_count(max_size)
         self.store_path = os.path.realpath(store_path)
+        self.audit_cache_dir = audit_cache_dir
+
+        # None means fill the free disk space
+        if max_size == common.AUTO_MAX_SIZE:
+            self.max_size = None
+        else:
+            self.max_size = deserialize.byte_count(max_size)
 
-        # FIXME add deserialize.positive_integer
-        if int(connection_retry_limit) < 0:
+        self.min_free_size = deserialize.byte_count(min_free_size)
+        if self.min_free_size < 0:
             raise exceptions.InvalidArgument()
-        self.connection_retry_limit = int(connection_retry_limit)
 
-        # FIXME add deserialize.positive_integer
-        if int(connection_retry_delay) < 0:
+        # build and audit io throttling, None means full speed
+        self.max_io_rate = None
+        if max_io_rate is not None:
+            self.max_io_rate = deserialize.byte_count(max_io_rate)
+            if self.max_io_rate <= 0:
+                raise exceptions.InvalidArgument()
+        if ionice is not None and ionice not in throttle.IONICE_CLASSES:
+            raise exceptions.InvalidArgument()
+        self.nice = nice
+        self.ionice = ionice
+
+        self.connection_retry_limit = deserialize.positive_integer(
+            connection_retry_limit
+        )
+        self.connection_retry_delay = deserialize.positive_integer(
+            connection_retry_delay
+        )
+
+        self.shard_size = deserialize.byte_count(shard_size)
+        self.workers = deserialize.positive_integer(workers)
+        if self.shard_size <= 0 or self.workers < 1:
             raise exceptions.InvalidArgument()
-        self.connection_retry_delay = int(connection_retry_delay)
+
+        # optional prometheus endpoint and json status file, the endpoint is
+        # only served while poll, build or farm run
+        self.metrics = None
+        self.metrics_port = None  # bound port, metrics_port 0 picks one
+        self._metrics_port = None
+        if metrics_port is not None or status_file:
+            self.metrics = metrics.Metrics(status_file=status_file)
+        if metrics_port is not None:
+            if not 0 <= int(metrics_port) <= 65535:
+                raise exceptions.InvalidArgument()
+            self._metrics_port = int(metrics_port)
+
+        self._connection = connection.Connection(
+            url, debug=debug, retry_limit=self.connection_retry_limit,
+            retry_delay=self.connection_retry_delay, metrics=self.metrics
+        )
+        self._priority_lowered = False
+        self._builder = None  # keeps the seed chain warm between calls
+        self._warmer = None  # prefetches shards for Client.audit
 
         # ensure storage dir exists
         if not os.path.exists(self.store_path):
@@ -58,39 +99,67 @@ class Client(object):
         print(__version__)
         return __version__
 
-    def _url_query(self, api_call, retries=0):
+    def _url_query(self, api_call, retry=True):
+        # starting at the retry limit makes the first failure final
+        retries = 0 if retry else self._connection.retry_limit
+        if self.metrics is None:
+            return self._connection.query(api_call, self.address, retries)
+        call = api_call.split("/")[2]  # /api/<call>/...
+        start_time = schedule.monotonic()
+        try:
+            return self._connection.query(api_call, self.address, retries)
+        except exceptions.DataservClientException:
+            self.metrics.inc("{0}_errors_total".format(call))
+            raise
+        finally:
+            self.metrics.inc("{0}_total".format(call))
+            self.metrics.observe("{0}_seconds".format(call),
+                                 schedule.monotonic() - start_time)
+            self._write_status()
+
+    def _serve_metrics(self):
+        if self._metrics_port is not None and self.metrics_port is None:
+            self.metrics_port = self.metrics.serve(self._metrics_port)
+
+    def _stop_metrics(self):
+        if self.metrics_port is not None:
+            self.metrics.stop()
+            self.metrics_port = None
+
+    def _write_status(self):
+        """Update the status file, failures never stop the node."""
         try:
+            self.metrics.write_status()
+        except (IOError, OSError) as e:
             if self.debug:
-                print("Query url: " + self.url + api_call)
-            response = urllib.request.urlopen(self.url + api_call)
-            if response.code == 200:
-                return True
-            return False  # pragma: no cover
-
-        except urllib.error.HTTPError as e:
-            if e.code == 409:
-                raise exceptions.AddressAlreadyRegistered(self.address,
-                                                          self.url)
-            elif e.code == 404:
-                raise exceptions.FarmerNotFound(self.url)
-            elif e.code == 400:
-                raise exceptions.InvalidAddress(self.address)
-            elif e.code == 500:  # pragma: no cover
-                raise exceptions.FarmerError(self.url)  # pragma: no cover
-            else:
-                raise e  # pragma: no cover
-        except HTTPException:
-            self._handle_connection_error(api_call, retries)
-        except urllib.error.URLError:
-            self._handle_connection_error(api_call, retries)
-        except socket.error:
-            self._handle_connection_error(api_call, retries)
-
-    def _handle_connection_error(self, api_call, retries):
-        if retries >= self.connection_retry_limit:
-            raise exceptions.ConnectionError(self.url)
-        time.sleep(self.connection_retry_delay)
-        return self._url_query(api_call, retries + 1)
+                print("Could not write status file: {0}".format(e))
+
+    def _lower_priority(self):
+        """Lower the priority once, call it before starting io threads."""
+        if not self._priority_lowered:
+            throttle.lower_priority(nice=self.nice, ionice=self.ionice,
+                                    debug=self.debug)
+            self._priority_lowered = True
+
+    def _get_builder(self):
+        """Lower the priority and return the shared Builder."""
+        self._lower_priority()
+        if self._builder is None:
+            from dataserv_client import builder
+            from dataserv_client import warmer
+            bucket = None
+            if self.max_io_rate is not None:
+                bucket = throttle.TokenBucket(self.max_io_rate)
+            audit_cache = cache.AuditCache.for_store(
+                self.store_path, directory=self.audit_cache_dir
+            )
+            self._builder = builder.Builder(self.address, self.shard_size,
+                                            0, throttle=bucket,
+                                            min_free_size=self.min_free_size,
+                                            audit_cache=audit_cache,
+                                            metrics=self.metrics)
+            self._builder.audit_stats = warmer.LatencyStats()
+        return self._builder
 
     def register(self):
         """Attempt to register the config address."""
@@ -107,32 +176,206 @@ class Client(object):
         print("Pinging {0} with address {1}.".format(self.url, self.address))
         return self._url_query("/api/ping/{0}".format(self.address))
 
+    def _ping_hint(self):
+        """Ping and return the servers back off hint in seconds or None."""
+        try:
+            self.ping()
+        except exceptions.FarmerBusy as e:
+            return e.retry_after
+        return self._connection.retry_after
+
     def poll(self, register_address=False, delay=common.DEFAULT_DELAY,
              limit=None):
-        """TODO doc string"""
+        """Ping the farmer every delay seconds until limit seconds passed.
+
+        The first ping is sent right away, later pings keep a fixed period
+        on a monotonic clock, phase shifted per address, and back off when
+        the server sends Retry-After.
+        """
         self._ensure_address_given()
-        stop_time = _now() + _timedelta(seconds=int(limit)) if limit else None
+        scheduler = schedule.Scheduler(int(delay), key=self.address,
+                                       limit=int(limit) if limit else None)
 
         if register_address:
             self.register()
 
-        while True:
-            self.ping()
+        self._serve_metrics()
+        try:
+            while True:
+                hint = self._ping_hint()
+                if scheduler.expired() or not scheduler.wait(hint):
+                    return True
+        finally:
+            self._stop_metrics()
+
+    def _report_height(self, height, retry=True):
+        self._url_query('/api/height/{0}/{1}'.format(self.address, height),
+                        retry=retry)
+
+    def _build(self, on_height=None, cleanup=False, rebuild=False):
+        """Resize the store to max_size, calls on_height with each new height.
+        Returns: (BuildResult { seed : hash, ... }, height)
+        """
+        bldr = self._get_builder()
+        stored = bldr.stored_height(self.store_path)
+        start = 0 if rebuild else stored  # rebuild regenerates everything
 
-            if stop_time and _now() >= stop_time:
-                return True
-            time.sleep(int(delay))
+        max_size = self.max_size
+        if max_size is None:
+            free = bldr.free_space(self.store_path) - self.min_free_size
+            max_size = (stored + max(free, 0) // self.shard_size)
+            max_size *= self.shard_size
+        height = int(max_size / self.shard_size)
+
+        from dataserv_client.builder import BuildResult
+        generated = BuildResult(start)
+        if stored > height:  # shrink, delete only the excess top heights
+            bldr.max_size = stored * self.shard_size
+            bldr.clean(self.store_path, max_size=max_size,
+                       workers=self.workers)
+        if start < height:  # grow the new tail, or everything on rebuild
+            bldr.max_size = max_size
+            shards = bldr.iter_build(self.store_path, debug=self.debug,
+                                     cleanup=cleanup, rebuild=rebuild,
+                                     start=start)
+            for shard_height, seed, file_hash in shards:
+                generated.append(seed, file_hash)
+                if self.metrics is not None:
+                    self.metrics.set("height", shard_height)
+                    self._write_status()
+                if on_height is not None:
+                    on_height(shard_height)
+            height = start + len(generated)  # may stop early
+        if self.metrics is not None:
+            self.metrics.set("height", height)
+        return generated, height
 
     def build(self, cleanup=False, rebuild=False):
-        """TODO doc string"""
-        self._ensure_address_given()
+        """Resize the store to max_size and report the new height once.
 
-        def on_generate_shard(height, seed, file_hash):
-            self._url_query('/api/height/{0}/{1}'.format(self.address, height))
-        bldr = builder.Builder(self.address, common.SHARD_SIZE, self.max_size,
-                               on_generate_shard=on_generate_shard)
-        generated = bldr.build(self.store_path, debug=self.debug,
-                               cleanup=cleanup, rebuild=rebuild)
-        height = len(generated)
-        self._url_query('/api/height/{0}/{1}'.format(self.address, height))
+        Only the shards between the height already on disk and the target
+        height are generated or deleted. With an automatic max_size the
+        target is the largest height that fits the free disk space.
+        """
+        self._ensure_address_given()
+        self._serve_metrics()
+        try:
+            generated, height = self._build(cleanup=cleanup, rebuild=rebuild)
+            self._report_height(height)
+        finally:
+            self._stop_metrics()
         return generated
+
+    def audit(self, seed, height, timeout=None):
+        """Compute the audit hash of the first height shards, raises
+        AuditTimeout if it can't be done within timeout seconds."""
+        result = self._get_builder().full_audit(seed, self.store_path,
+                                                height, debug=self.debug,
+                                                timeout=timeout)
+        if self.debug and self._warmer is not None:
+            print("Audit latency percentiles: {0}".format(
+                self._warmer.stats()))
+        return result
+
+    def warm(self, budget=common.DEFAULT_WARM_BUDGET, height=None):
+        """Prefetch the stored shards for the following audits.
+
+        Audits before the first pass are recorded as cold, later ones as
+        warm, see Warmer.stats. Returns: the running Warmer
+        """
+        if self._warmer is None:
+            from dataserv_client import warmer
+            bldr = self._get_builder()
+            if height is None:
+                height = bldr.stored_height(self.store_path)
+            self._warmer = warmer.Warmer(
+                bldr, self.store_path, height,
+                budget=deserialize.byte_count(budget)
+            ).start()
+        return self._warmer
+
+    def stop_warming(self):
+        if self._warmer is not None:
+            self._warmer.stop()
+            self._warmer = None
+
+    def farm(self, register_address=False, delay=common.DEFAULT_DELAY,
+             limit=None, rebuild=False, warm_budget=None):
+        """Build in the background while pinging the farmer on schedule.
+
+        Runs until limit is reached or SIGTERM is received. Heights are
+        reported from the polling loop, so only the latest one is sent and
+        pending heights are flushed on shutdown. With a warm_budget the
+        shards are prefetched into the page cache once the build is done.
+        """
+        self._ensure_address_given()
+        scheduler = schedule.Scheduler(int(delay), key=self.address,
+                                       limit=int(limit) if limit else None)
+        stop = threading.Event()
+        pending = [None]
+        built = [None]
+        errors = []
+        if warm_budget is not None:
+            warm_budget = deserialize.byte_count(warm_budget)
+
+        if register_address:
+            self.register()
+
+        def on_height(height):
+            pending[0] = height
+
+        def work():
+            try:
+                generated, height = self._build(on_height, rebuild=rebuild)
+                pending[0] = built[0] = height
+            except Exception as e:  # raised again in the polling loop
+                errors.append(e)
+
+        def flush(retry=True):
+            height = pending[0]
+            if height is not None:
+                self._report_height(height, retry=retry)
+                if pending[0] == height:
+                    pending[0] = None
+
+        def on_sigterm(signum, frame):
+            stop.set()
+
+        self._serve_metrics()
+        try:
+            old_handler = signal.signal(signal.SIGTERM, on_sigterm)
+        except ValueError:  # not in main thread
+            old_handler = None
+
+        self._lower_priority()  # inherited by the worker and warmer
+        worker = threading.Thread(target=work)
+        worker.daemon = True
+        worker.start()
+        failed = True
+        try:
+            while not stop.is_set():
+                hint = self._ping_hint()
+                flush()
+                if errors:
+                    raise errors[0]
+                if warm_budget and built[0] is not None:  # idle from now on
+                    self.warm(warm_budget, built[0])  # for audit processes
+                if scheduler.expired() or not scheduler.wait(hint, stop.wait):
+                    break
+            failed = False
+        finally:
+            self.stop_warming()
+            self._get_builder().stop()  # also cancels a running shard write
+            worker.join()
+            self._builder = None  # stopped builders can't build again
+            if old_handler is not None:
+                signal.signal(signal.SIGTERM, old_handler)
+            self._stop_metrics()
+            try:  # a single attempt, don't hold up the shutdown
+                flush(retry=False)
+            except exceptions.DataservClientException as e:
+                if not failed:
+                    raise
+                if self.debug:  # keep the original error
+                    print("Could not report height: {0}".format(e))
+        return True
@@ -0,0 +1,89 @@
+import threading
+from multiprocessing.pool import ThreadPool
+
+from dataserv_client import common
+from dataserv_client import connection
+from dataserv_client import deserialize
+from dataserv_client import exceptions
+
+
+class BatchClient(object):
+    """Register, ping and report heights for many addresses at once.
+
+    Queries run on a bounded pool of workers, each keeping its own
+    keep-alive connection to the farmer. Results map every address to
+    True or the exception raised for it.
+    """
+
+    def __init__(self, url=common.DEFAULT_URL, debug=False,
+                 workers=common.DEFAULT_BATCH_WORKERS,
+                 connection_retry_limit=common.DEFAULT_CONNECTION_RETRY_LIMIT,
+                 connection_retry_delay=common.DEFAULT_CONNECTION_RETRY_DELAY):
+
+        self.url = url
+        self.debug = debug
+        self.workers = deserialize.positive_integer(workers)
+        if self.workers < 1:
+            raise exceptions.InvalidArgument()
+        self.connection_retry_limit = deserialize.positive_integer(
+            connection_retry_limit
+        )
+        self.connection_retry_delay = deserialize.positive_integer(
+            connection_retry_delay
+        )
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = connection.Connection(
+                self.url, debug=self.debug,
+                retry_limit=self.connection_retry_limit,
+                retry_delay=self.connection_retry_delay
+            )
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _query(self, query):
+        import urllib.error
+        address, api_call = query
+        try:
+            return address, self._connection().query(api_call, address)
+        except (exceptions.DataservClientException,
+                urllib.error.HTTPError) as e:  # unexpected status
+            return address, e
+
+    def _run(self, queries):
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        return dict(self._pool.map(self._query, queries))
+
+    def close(self):
+        """Stop the workers and close their connections."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    def register(self, addresses):
+        """Attempt to register the addresses."""
+        return self._run([(a, "/api/register/{0}".format(a))
+                          for a in addresses])
+
+    def ping(self, addresses):
+        """Attempt keep-alive with the server for the addresses."""
+        return self._run([(a, "/api/ping/{0}".format(a)) for a in addresses])
+
+    def height(self, heights):
+        """Report heights given as { address : height, ... }."""
+        return self._run([(a, "/api/height/{0}/{1}".format(a, h))
+                          for a, h in heights.items()])
@@ -1,18 +1,131 @@
 import os
+import struct
 import hashlib
 import RandomIO
 import binascii
+import threading
 import partialhash
 from datetime import datetime
+try:
+    from collections.abc import ItemsView, Mapping, ValuesView
+except ImportError:  # python 2
+    from collections import ItemsView, Mapping, ValuesView
+from multiprocessing.pool import ThreadPool
+from dataserv_client import exceptions
+from dataserv_client.throttle import ThrottledWriter
+from dataserv_client.schedule import monotonic as _monotonic
+
+
+AUDIT_PROBE = 8  # shards read before projecting the audit time
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB reads when hashing shards
+
+
+class _ItemsView(ItemsView):
+    """Streams (seed, hash) pairs in height order."""
+
+    def __iter__(self):
+        for height, seed, file_hash in self._mapping.heights():
+            yield seed, file_hash
+
+
+class _ValuesView(ValuesView):
+    """Streams hashes in height order."""
+
+    def __iter__(self):
+        hashes = self._mapping._hashes
+        for i in range(0, len(hashes), 32):
+            yield binascii.hexlify(hashes[i:i + 32]).decode('utf-8')
+
+
+class BuildResult(Mapping):
+    """Compact { seed : hash, ... } of consecutive shards from height start.
+
+    Seeds and hashes are kept as 32 byte digests in two bytearrays, the
+    index for lookups by seed is only built on first use.
+    """
+
+    __slots__ = ("start", "_seeds", "_hashes", "_index")
+    _HEADER = struct.Struct(">Q")  # start height
+
+    def __init__(self, start=0):
+        self.start = start
+        self._seeds = bytearray()
+        self._hashes = bytearray()
+        self._index = None
+
+    def append(self, seed, file_hash):
+        """Add the next shard, seed and hash given as hex strings."""
+        self._seeds.extend(binascii.unhexlify(seed))
+        self._hashes.extend(binascii.unhexlify(file_hash))
+        self._index = None
+
+    def __len__(self):
+        return len(self._seeds) // 32
+
+    def __iter__(self):
+        for i in range(0, len(self._seeds), 32):
+            yield binascii.hexlify(self._seeds[i:i + 32]).decode('utf-8')
+
+    def __getitem__(self, seed):
+        if self._index is None:
+            self._index = dict((bytes(self._seeds[i:i + 32]), i)
+                               for i in range(0, len(self._seeds), 32))
+        try:
+            i = self._index[binascii.unhexlify(seed)]
+        except (KeyError, TypeError, ValueError, binascii.Error):
+            raise KeyError(seed)
+        return binascii.hexlify(self._hashes[i:i + 32]).decode('utf-8')
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+    def heights(self):
+        """Stream (height, seed, hash) in height order, height from 1."""
+        for n, seed in enumerate(self, self.start + 1):
+            i = (n - self.start - 1) * 32
+            yield n, seed, binascii.hexlify(self._hashes[i:i + 32]).decode(
+                'utf-8'
+            )
+
+    def save(self, path):
+        """Serialize to path as the start height and the digest pairs."""
+        with open(path, 'wb') as fp:
+            fp.write(self._HEADER.pack(self.start))
+            for i in range(0, len(self._seeds), 32):
+                fp.write(self._seeds[i:i + 32])
+                fp.write(self._hashes[i:i + 32])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        result = cls(cls._HEADER.unpack(data[:cls._HEADER.size])[0])
+        for i in range(cls._HEADER.size, len(data), 64):
+            result._seeds.extend(data[i:i + 32])
+            result._hashes.extend(data[i + 32:i + 64])
+        return result
 
 
 class Builder:
 
-    def __init__(self, address, shard_size, max_size, on_generate_shard=None):
+    def __init__(self, address, shard_size, max_size, on_generate_shard=None,
+                 min_free_size=0, throttle=None, audit_cache=None,
+                 metrics=None):
         self.address = address
         self.shard_size = shard_size
         self.max_size = max_size
         self.on_generate_shard = on_generate_shard
+        self.min_free_size = min_free_size
+        self.throttle = throttle  # TokenBucket shared by build and audit
+        self.audit_stats = None  # optional LatencyStats of shard audits
+        self.audit_cache = audit_cache  # optional AuditCache
+        self.metrics = metrics  # optional Metrics
+        self._seeds = bytearray()  # cached 32 byte seed digests, kept warm
+        self._seeds_lock = threading.Lock()
+        self._stop = threading.Event()
 
     @staticmethod
     def sha256(content):
@@ -20,78 +133,365 @@ class Builder:
         content = content.encode('utf-8')
         return hashlib.sha256(content).hexdigest()
 
+    @staticmethod
+    def free_space(path):
+        """Bytes available to unprivileged users on the disk of path."""
+        if hasattr(os, "statvfs"):
+            stat = os.statvfs(path)
+            return stat.f_bavail * stat.f_frsize
+        import ctypes  # windows
+        free = ctypes.c_ulonglong(0)
+        ctypes.windll.kernel32.GetDiskFreeSpaceExW(
+            ctypes.c_wchar_p(path), None, None, ctypes.pointer(free)
+        )
+        return free.value
+
     def build_seed(self, height):
         """Deterministically build a seed."""
-        seed = self.sha256(self.address)
-        for i in range(height):
-            seed = self.sha256(seed)
-        return seed
+        seed = self.seed_range(height, height + 1)
+        return binascii.hexlify(seed).decode('utf-8')
+
+    def build_seeds(self, height):
+        """Deterministically build the first height seeds in order."""
+        return list(self._iter_seeds(0, height))
+
+    def _iter_seeds(self, start, stop):
+        seeds = self.seed_range(start, stop)
+        for i in range(0, len(seeds), 32):
+            yield binascii.hexlify(seeds[i:i + 32]).decode('utf-8')
+
+    def seed_range(self, start, stop):
+        """Seeds from height start to stop as one bytearray of 32 byte
+        SHA-256 digests, hexlify a digest to get the seed."""
+        seeds = self._seeds
+        if len(seeds) < stop * 32:
+            with self._seeds_lock:
+                height = len(seeds) // 32  # may have grown while waiting
+                if height < stop:
+                    seeds.extend(self._chain(height, stop))
+        return seeds[start * 32:stop * 32]
+
+    def _chain(self, height, stop):
+        """Seeds from the cached height to stop, computed off the cache so
+        other threads never see unfilled digests."""
+        if height == 0:
+            digest = hashlib.sha256(self.address.encode('utf-8'))
+        else:  # each seed is the hash of the previous hex seed
+            digest = hashlib.sha256(binascii.hexlify(self._seeds[-32:]))
+        digest = digest.digest()
+        chain = bytearray(32 * (stop - height))  # preallocate
+        for i in range(0, len(chain), 32):
+            chain[i:i + 32] = digest
+            digest = hashlib.sha256(binascii.hexlify(digest)).digest()
+        return chain
+
+    def _store_changed(self):
+        if self.audit_cache is not None:
+            self.audit_cache.clear()
+
+    @staticmethod
+    def _stat_shards(paths, deadline=None):
+        """os.stat of each path or None if missing, None for all once the
+        monotonic deadline has passed."""
+        stats = []
+        for path in paths:
+            if deadline is not None and _monotonic() > deadline:
+                return None
+            try:
+                stats.append(os.stat(path))
+            except OSError:  # missing shard
+                stats.append(None)
+        return stats
+
+    def fingerprint(self, store_path, start, stop, stats=None):
+        """Hash of the name, inode, size and mtime of the shards, from the
+        given _stat_shards results if any."""
+        seeds = list(self._iter_seeds(start, stop))
+        if stats is None:
+            stats = self._stat_shards(
+                [os.path.join(store_path, seed) for seed in seeds]
+            )
+        hasher = hashlib.sha256()
+        for seed, stat in zip(seeds, stats):
+            if stat is None:
+                line = "{0} -\n".format(seed)
+            else:
+                line = "{0} {1} {2} {3!r}\n".format(
+                    seed, stat.st_ino, stat.st_size, stat.st_mtime
+                )
+            hasher.update(line.encode('utf-8'))
+        return hasher.hexdigest()
+
+    def stop(self):
+        """Stop the running build and any later build."""
+        self._stop.set()
 
     def generate_shard(self, seed, store_path, cleanup=False, rebuild=False):
         """Save a shard, and return its SHA-256 hash."""
 
         # save the shard
         path = os.path.join(store_path, seed)
+        file_hash = None
         if not os.path.isfile(path) or rebuild:
-            RandomIO.RandomIO(seed).genfile(self.shard_size, path)
-        file_hash = hashlib.sha256(open(path, 'rb').read()).hexdigest()
+            self._store_changed()
+            start_time = _monotonic()
+            if self.throttle:  # hash while writing, no throttled read back
+                hasher = hashlib.sha256()
+                try:
+                    with open(path, 'wb') as fp:
+                        fp = ThrottledWriter(fp, self.throttle, hasher,
+                                             self._stop)
+                        RandomIO.RandomIO(seed).dump(fp, self.shard_size)
+                except exceptions.BuildStopped:
+                    os.remove(path)  # never leave a partial shard
+                    raise
+                file_hash = hasher.hexdigest()
+            else:
+                RandomIO.RandomIO(seed).genfile(self.shard_size, path)
+            if self.metrics is not None:
+                self.metrics.inc("shards_generated_total")
+                self.metrics.observe("shard_seconds",
+                                     _monotonic() - start_time)
+        if file_hash is None:
+            file_hash = self.hash_file(path)
         if cleanup:
+            self._store_changed()
             os.remove(path)
         return file_hash
 
-    def build(self, store_path, debug=False, cleanup=False, rebuild=False):
-        """Fill the farmer with data up to their max.
-        Returns: { seed : hash, ... }
+    def hash_file(self, path):
+        """SHA-256 of a shard, read in chunks through the throttle."""
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as fp:
+            chunk = fp.read(HASH_CHUNK_SIZE)
+            while chunk:
+                if self.throttle:
+                    self.throttle.consume(len(chunk))
+                hasher.update(chunk)
+                chunk = fp.read(HASH_CHUNK_SIZE)
+        return hasher.hexdigest()
+
+    def iter_build(self, store_path, debug=False, cleanup=False,
+                   rebuild=False, start=0):
+        """Fill the farmer with data up to their max, from height start.
+
+        Yields (height, seed, hash) as each shard is done. The next shard
+        is only generated when asked for, close the generator or call stop
+        to cancel.
         """
-        generated = {}
         height = int(self.max_size / self.shard_size)
-        for shard_num in range(height):
-            seed = self.build_seed(shard_num)
+        for shard_num, seed in enumerate(self._iter_seeds(start, height),
+                                         start):
+            if self._stop.is_set():
+                break
             path = os.path.join(store_path, seed)
 
             # only generate if the file isn't there
-            will_generate = not os.path.isfile(path) or rebuild
-            file_hash = self.generate_shard(seed, store_path, cleanup=cleanup,
-                                            rebuild=rebuild)
-            generated[seed] = file_hash
+            exists = os.path.isfile(path)
+            will_generate = not exists or rebuild
+
+            # stop at the largest height that fits on the disk
+            if not exists and not self._has_space(store_path):
+                if debug:
+                    print("Stopping at height {0}. Not enough free "
+                          "space.".format(shard_num))
+                break
+
+            try:
+                file_hash = self.generate_shard(seed, store_path,
+                                                cleanup=cleanup,
+                                                rebuild=rebuild)
+            except exceptions.BuildStopped:  # stop called mid write
+                break
             if will_generate and debug:
                 print("Saving seed {0} with SHA-256 hash {1}.".format(seed, file_hash))
 
             if (not will_generate) and debug:
                 print("Skipping seed {0}. Already exists.".format(seed))
 
-            if self.on_generate_shard:
-                self.on_generate_shard(shard_num + 1, seed, file_hash)
+            yield shard_num + 1, seed, file_hash
 
+    def build(self, store_path, debug=False, cleanup=False, rebuild=False,
+              start=0):
+        """Fill the farmer with data up to their max, from height start.
+        Returns: BuildResult { seed : hash, ... }
+        """
+        generated = BuildResult(start)
+        for height, seed, file_hash in self.iter_build(
+                store_path, debug=debug, cleanup=cleanup, rebuild=rebuild,
+                start=start):
+            generated.append(seed, file_hash)
+            if self.on_generate_shard:
+                self.on_generate_shard(height, seed, file_hash)
         return generated
 
-    def clean(self, store_path):
-        """Delete shards from path."""
-        for shard_num in range(int(self.max_size / self.shard_size)):
-            seed = self.build_seed(shard_num)
-            path = os.path.join(store_path, seed)
-            if os.path.exists(path):
-                os.remove(path)
+    def _has_space(self, store_path):
+        needed = self.shard_size + self.min_free_size
+        return self.free_space(store_path) >= needed
 
-    def audit(self, seed, store_path, height):
-        """Do an audit over the data."""
-        audit_results = []
-        for i in range(height):
-            seed_hash = self.build_seed(i)
+    def stored_height(self, store_path):
+        """Count the consecutive shards already on disk from height 0."""
+        stored = set(os.listdir(store_path))
+        height = 0
+        for seed in self._iter_seeds(0, len(stored)):  # can't be higher
+            if seed not in stored:
+                break
+            height += 1
+        return height
+
+    def clean(self, store_path, max_size=None, workers=8):
+        """Delete shards from path, or only those above a lower max_size.
+
+        The store is listed once and matching shards are removed in
+        parallel. Returns the number of removed shards.
+        """
+        keep = int(max_size / self.shard_size) if max_size is not None else 0
+        height = int(self.max_size / self.shard_size)
+        if keep >= height:
+            return 0
+
+        stored = set(os.listdir(store_path))
+        paths = [os.path.join(store_path, seed)
+                 for seed in self.build_seeds(height)[keep:]
+                 if seed in stored]
+        if not paths:
+            return 0
+
+        self._store_changed()
+        pool = ThreadPool(max(1, min(workers, len(paths))))
+        try:
+            pool.map(os.remove, paths)
+        finally:
+            pool.close()
+            pool.join()
+        return len(paths)
+
+    def _sample(self, seed, path):
+        """Returns: the 32 byte audit digest of one shard."""
+        if self.throttle:
+            self.throttle.consume(1024 * 3)
+        start_time = _monotonic()
+        digest = partialhash.sample(path, 1024, sample_count=3, seed=seed)
+        if self.audit_stats is not None:
+            self.audit_stats.add(_monotonic() - start_time)
+        return digest
+
+    def audit_range(self, seed, store_path, start, stop):
+        """Audit shards from height start to stop.
+        Returns: bytearray of the 32 byte digests in height order
+        """
+        start_time = _monotonic()
+        digests = bytearray(32 * max(stop - start, 0))  # preallocate
+        for i, seed_hash in enumerate(self._iter_seeds(start, stop)):
             seed_path = os.path.join(store_path, seed_hash)
-            digest = partialhash.sample(seed_path, 1024, sample_count=3, seed=seed)
-            audit_results.append(binascii.hexlify(digest))
-        return audit_results
+            digests[i * 32:i * 32 + 32] = self._sample(seed, seed_path)
+        self._audited(start_time, len(digests) // 32)
+        return digests
+
+    def _audited(self, start_time, shards):
+        if self.metrics is not None:
+            self.metrics.inc("audits_total")
+            self.metrics.inc("audit_shards_total", shards)
+            self.metrics.observe("audit_seconds", _monotonic() - start_time)
+
+    def _timed_out(self, done, height, timeout):
+        if self.metrics is not None:
+            self.metrics.inc("audit_timeouts_total")
+        raise exceptions.AuditTimeout(done, height, timeout)
+
+    def timed_audit(self, seed, store_path, height, timeout,
+                    on_progress=None, deadline=None, stats=None):
+        """Compute the full_audit hash within timeout seconds.
+
+        The shards are stat'ed once and read in inode order to limit
+        seeks, and each digest is hashed as soon as all lower heights are
+        done. AuditTimeout is raised once the deadline passes, or after the
+        first AUDIT_PROBE shards as soon as the projected time exceeds it.
+        on_progress(done, height) is called after every shard. deadline
+        and stats let full_audit share its time budget and stat pass.
+        """
+        start_time = _monotonic()
+        if deadline is None:
+            deadline = start_time + timeout
+        paths = [os.path.join(store_path, seed_hash)
+                 for seed_hash in self._iter_seeds(0, height)]
+        if stats is None:
+            stats = self._stat_shards(paths, deadline)
+            if stats is None:
+                self._timed_out(0, height, timeout)
+        order = sorted(range(height),  # missing shards fail first
+                       key=lambda i: stats[i].st_ino if stats[i] else 0)
+        sample_time = _monotonic()
 
-    def full_audit(self, seed, store_path, height, debug=False):
-        """Compute one hash from audit."""
-        hash_result = ""
+        digests = bytearray(32 * height)
+        done = bytearray(height)
+        hasher = hashlib.sha256()
+        hashed = 0
+        for count, i in enumerate(order, 1):
+            digests[i * 32:i * 32 + 32] = self._sample(seed, paths[i])
+            done[i] = 1
+            while hashed < height and done[hashed]:  # in height order
+                hasher.update(
+                    binascii.hexlify(digests[hashed * 32:hashed * 32 + 32])
+                )
+                hashed += 1
+            if on_progress is not None:
+                on_progress(count, height)
 
+            now = _monotonic()
+            per_shard = (now - sample_time) / count
+            projected = now + per_shard * (height - count)
+            probed = count >= min(AUDIT_PROBE, height)
+            if now > deadline or (probed and projected > deadline):
+                self._timed_out(count, height, timeout)
+        self._audited(start_time, height)
+        return hasher.hexdigest()
+
+    def audit(self, seed, store_path, height):
+        """Do an audit over the data."""
+        digests = self.audit_range(seed, store_path, 0, height)
+        return [binascii.hexlify(digests[i:i + 32])
+                for i in range(0, len(digests), 32)]
+
+    def full_audit(self, seed, store_path, height, debug=False,
+                   timeout=None, on_progress=None):
+        """Compute one hash from audit, see timed_audit for timeout."""
         start_time = datetime.utcnow()
-        audit_results = self.audit(seed, store_path, height)
-        for audit in audit_results:
-            hash_result += str(audit.decode("utf-8"))
-        hash_result = self.sha256(hash_result)
+        deadline = None
+        if timeout is not None:
+            deadline = _monotonic() + timeout
+
+        # one stat pass, bounded by the deadline, for the cache and order
+        stats = None
+        if self.audit_cache is not None or timeout is not None:
+            paths = [os.path.join(store_path, seed_hash)
+                     for seed_hash in self._iter_seeds(0, height)]
+            stats = self._stat_shards(paths, deadline)
+            if stats is None:
+                self._timed_out(0, height, timeout)
+
+        cache_key = None
+        if self.audit_cache is not None:
+            fingerprint = self.fingerprint(store_path, 0, height, stats)
+            cache_key = self.audit_cache.key(seed, 0, height, fingerprint)
+            hash_result = self.audit_cache.get(cache_key)
+            if debug:
+                print("Audit cache {0}, {1} hits {2} misses.".format(
+                    "miss" if hash_result is None else "hit",
+                    self.audit_cache.hits, self.audit_cache.misses
+                ))
+            if hash_result is not None:
+                return hash_result
+
+        if timeout is not None:
+            hash_result = self.timed_audit(seed, store_path, height, timeout,
+                                           on_progress=on_progress,
+                                           deadline=deadline, stats=stats)
+        else:  # hash of the concatenated hex digests
+            digests = self.audit_range(seed, store_path, 0, height)
+            hash_result = hashlib.sha256(binascii.hexlify(digests)).hexdigest()
+        if cache_key is not None:
+            self.audit_cache.put(cache_key, hash_result)
 
         if debug:
             final_time = (datetime.utcnow() - start_time).seconds
@@ -102,8 +502,8 @@ class Builder:
 
     def checkup(self, store_path):
         """Make sure the shards exist."""
-        for shard_num in range(int(self.max_size / self.shard_size)):
-            seed = self.build_seed(shard_num)
+        height = int(self.max_size / self.shard_size)
+        for seed in self._iter_seeds(0, height):
             path = os.path.join(store_path, seed)
             if not os.path.exists(path):
                 return False
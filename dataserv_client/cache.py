@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import binascii
+import tempfile
+import threading
+from collections import OrderedDict
+
+from dataserv_client import common
+
+
+class AuditCache(object):
+    """Size bounded audit results persisted as json.
+
+    Keys combine the challenge seed, the height range and a fingerprint of
+    the shards, so changed shards never hit stale results. The least
+    recently used entries are dropped first.
+    """
+
+    def __init__(self, path, max_entries=common.DEFAULT_AUDIT_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = None  # loaded on first use
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_store(cls, store_path, directory=common.DEFAULT_AUDIT_CACHE_DIR,
+                  max_entries=common.DEFAULT_AUDIT_CACHE_ENTRIES,
+                  max_stores=common.DEFAULT_AUDIT_CACHE_STORES):
+        """Separate cache file per store, so stores on one host never
+        clear each others results. Only the files of the max_stores most
+        recently used stores are kept."""
+        store_path = os.path.realpath(store_path).encode('utf-8')
+        name = hashlib.sha256(store_path).hexdigest()[:16] + ".json"
+        cls._prune(directory, max_stores, keep=name)
+        return cls(os.path.join(directory, name), max_entries=max_entries)
+
+    @staticmethod
+    def _prune(directory, max_stores, keep):
+        """Remove the least recently written store files above max_stores."""
+        try:
+            names = [n for n in os.listdir(directory)
+                     if n.endswith(".json") and n != keep]
+        except OSError:  # no cache written yet
+            return
+        ages = []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                ages.append((os.path.getmtime(path), path))
+            except OSError:  # removed by another process
+                pass
+        ages.sort(reverse=True)
+        for mtime, path in ages[max(max_stores - 1, 0):]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def key(seed, start, stop, fingerprint):
+        if not isinstance(seed, bytes):
+            seed = seed.encode('utf-8')
+        seed = binascii.hexlify(seed).decode('utf-8')
+        return "{0}:{1}:{2}:{3}".format(seed, start, stop, fingerprint)
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self.path) as fp:
+                    self._entries.update(json.load(fp))
+            except (IOError, OSError, ValueError):  # missing or corrupt
+                pass
+        return self._entries
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(list(self._entries.items()), fp)
+            if hasattr(os, "replace"):
+                os.replace(tmp_path, self.path)
+            else:  # python 2
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                os.rename(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, key):
+        with self._lock:
+            entries = self._load()
+            value = entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            entries[key] = value  # most recently used last
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = value
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        """Drop all results, called whenever the store changes."""
+        with self._lock:
+            entries = self._load()
+            if entries:
+                entries.clear()
+                self._save()
@@ -2,6 +2,24 @@ import sys
 import argparse
 from dataserv_client import common
 from dataserv_client import api
+from dataserv_client import config
+from dataserv_client import throttle
+
+
+def _add_config_args(parser):
+    # config
+    default = common.DEFAULT_CONFIG_PATH
+    parser.add_argument(
+        "--config", default=None,
+        help="Json config with named profiles. (default: {0}).".format(default)
+    )
+
+    # profile
+    default = common.DEFAULT_PROFILE
+    parser.add_argument(
+        "--profile", default=None,
+        help="Config profile to use. (default: {0}).".format(default)
+    )
 
 
 def _add_programm_args(parser):
@@ -20,7 +38,15 @@ def _add_programm_args(parser):
     default = common.DEFAULT_MAX_SIZE
     parser.add_argument(
         "--max_size", default=default,
-        help="Maximum data size in bytes. (default: {0}).".format(default)
+        help=("Maximum data size in bytes or 'auto' to fill the free disk "
+              "space. (default: {0}).".format(default))
+    )
+
+    # min_free_size
+    default = common.DEFAULT_MIN_FREE_SIZE
+    parser.add_argument(
+        "--min_free_size", default=default,
+        help="Free disk space to keep in bytes. (default: {0}).".format(default)
     )
 
     # store_path
@@ -30,6 +56,54 @@ def _add_programm_args(parser):
         help="Storage path. (default: {0}).".format(default)
     )
 
+    # max_io_rate
+    parser.add_argument(
+        "--max_io_rate", default=None,
+        help="Maximum build and audit disk io in bytes per second."
+    )
+
+    # nice
+    parser.add_argument(
+        "--nice", default=None, type=int,
+        help="Increment the cpu niceness of build and audit."
+    )
+
+    # ionice
+    parser.add_argument(
+        "--ionice", default=None, choices=sorted(throttle.IONICE_CLASSES),
+        help="Io scheduling class of build and audit (linux only)."
+    )
+
+    # connection_retry_limit
+    default = common.DEFAULT_CONNECTION_RETRY_LIMIT
+    parser.add_argument(
+        "--connection_retry_limit", default=default, type=int,
+        help="Connection retries before giving up. (default: {0}).".format(
+            default
+        )
+    )
+
+    # connection_retry_delay
+    default = common.DEFAULT_CONNECTION_RETRY_DELAY
+    parser.add_argument(
+        "--connection_retry_delay", default=default, type=int,
+        help="Seconds between connection retries. (default: {0}).".format(
+            default
+        )
+    )
+
+    # metrics_port
+    parser.add_argument(
+        "--metrics_port", default=None, type=int,
+        help="Serve prometheus metrics on this localhost port."
+    )
+
+    # status_file
+    parser.add_argument(
+        "--status_file", default=None,
+        help="Keep a json status with the metrics at this path."
+    )
+
     # debug
     parser.add_argument('--debug', action='store_true',
                         help="Show debug information.")
@@ -84,20 +158,52 @@ def _add_build(command_parser):
                               help="Replace previously files.")
 
 
+def _add_farm(command_parser):
+    farm_parser = command_parser.add_parser(
+        "farm", help="Build in the background while polling the farmer."
+    )
+    farm_parser.add_argument(
+        "--delay", default=common.DEFAULT_DELAY,
+        help="Deley between each ping."
+    )
+    farm_parser.add_argument(
+        "--limit", default=None, help="Limit farm time in seconds."
+    )
+    farm_parser.add_argument(
+        '--register_address', action='store_true',
+        help="Register address before farming."
+    )
+    farm_parser.add_argument('--rebuild', action='store_true',
+                             help="Replace previously files.")
+    farm_parser.add_argument(
+        "--warm_budget", default=None,
+        help="Page cache bytes to prefetch shards into once built."
+    )
+
+
 def _parse_args(args):
     class ArgumentParser(argparse.ArgumentParser):
         def error(self, message):
             sys.stderr.write('error: %s\n' % message)
             self.print_help()
             sys.exit(2)
-    # TODO let user put in store path and max size shard size is 128
 
     # setup parser
     description = "Dataserve client command-line interface."
     parser = ArgumentParser(description=description)
 
+    _add_config_args(parser)
     _add_programm_args(parser)
 
+    # config profile settings replace the defaults, arguments override them
+    config_parser = argparse.ArgumentParser(add_help=False)
+    _add_config_args(config_parser)
+    config_args = config_parser.parse_known_args(args=args)[0]
+    parser.set_defaults(shard_size=common.SHARD_SIZE,
+                        workers=common.DEFAULT_WORKERS)
+    parser.set_defaults(**config.load(config_args.config,
+                                      config_args.profile))
+
     command_parser = parser.add_subparsers(
         title='commands', dest='command', metavar="<command>"
     )
@@ -107,6 +213,7 @@ def _parse_args(args):
     _add_ping(command_parser)
     _add_poll(command_parser)
     _add_build(command_parser)
+    _add_farm(command_parser)
 
     # get values
     arguments = vars(parser.parse_args(args=args))
@@ -124,5 +231,17 @@ def main(args):
         debug=arguments.pop("debug"),
         max_size=arguments.pop("max_size"),
         store_path=arguments.pop("store_path"),
+        min_free_size=arguments.pop("min_free_size"),
+        max_io_rate=arguments.pop("max_io_rate"),
+        nice=arguments.pop("nice"),
+        ionice=arguments.pop("ionice"),
+        metrics_port=arguments.pop("metrics_port"),
+        status_file=arguments.pop("status_file"),
+        connection_retry_limit=arguments.pop("connection_retry_limit"),
+        connection_retry_delay=arguments.pop("connection_retry_delay"),
+        shard_size=arguments.pop("shard_size"),
+        workers=arguments.pop("workers"),
     )
+    arguments.pop("config")
+    arguments.pop("profile")
     return getattr(client, command_name)(**arguments)
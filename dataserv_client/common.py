@@ -5,14 +5,34 @@ DEFAULT_URL = "http://status.driveshare.org"
 DEFAULT_DELAY = 15
 
 DEFAULT_APP_HOME = os.path.join(os.path.expanduser("~"), ".storj")
+DEFAULT_CONFIG_PATH = os.path.join(DEFAULT_APP_HOME, "config.json")
+DEFAULT_PROFILE = "default"  # other profiles override its settings
 
 
 # build
 SHARD_SIZE = 1024 * 1024 * 128  # 128 MB
 DEFAULT_MAX_SIZE = 1024 * 1024 * 1024  # 1 GB
 DEFAULT_STORE_PATH = os.path.join(DEFAULT_APP_HOME, "store")
+DEFAULT_MIN_FREE_SIZE = 1024 * 1024 * 1024  # 1 GB headroom
+AUTO_MAX_SIZE = "auto"  # fill the available disk space
+DEFAULT_WORKERS = 8  # concurrent shard removals
+
+
+# audit page cache warming
+DEFAULT_WARM_BUDGET = 1024 * 1024 * 256  # 256 MB
+DEFAULT_WARM_INTERVAL = 60 * 10  # 10 mins
+
+
+# audit result cache
+DEFAULT_AUDIT_CACHE_DIR = os.path.join(DEFAULT_APP_HOME, "audit_cache")
+DEFAULT_AUDIT_CACHE_ENTRIES = 1024
+DEFAULT_AUDIT_CACHE_STORES = 16  # per store files kept in the cache dir
 
 
 # connection retry
 DEFAULT_CONNECTION_RETRY_LIMIT = 12  # 12 * 5 mins = 1 hour
 DEFAULT_CONNECTION_RETRY_DELAY = 300   # 5 mins
+
+
+# batch
+DEFAULT_BATCH_WORKERS = 8  # concurrent connections to the farmer
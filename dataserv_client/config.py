@@ -0,0 +1,143 @@
+import os
+import json
+
+from dataserv_client import common
+from dataserv_client import deserialize
+from dataserv_client import exceptions
+from dataserv_client import throttle
+
+try:
+    _STRING_TYPES = (str, unicode)
+except NameError:  # python 3
+    _STRING_TYPES = (str,)
+
+
+def _string(value):
+    if not isinstance(value, _STRING_TYPES):
+        raise TypeError(value)
+    return value
+
+
+def _path(value):
+    return os.path.expanduser(_string(value))
+
+
+def _boolean(value):
+    if not isinstance(value, bool):
+        raise TypeError(value)
+    return value
+
+
+def _size(value):
+    return deserialize.positive_integer(deserialize.byte_count(value))
+
+
+def _nonzero_size(value):
+    value = _size(value)
+    if value == 0:
+        raise exceptions.InvalidArgument()
+    return value
+
+
+def _max_size(value):
+    if value == common.AUTO_MAX_SIZE:
+        return value
+    return _size(value)
+
+
+def _workers(value):
+    value = deserialize.positive_integer(value)
+    if value == 0:
+        raise exceptions.InvalidArgument()
+    return value
+
+
+def _port(value):
+    value = deserialize.positive_integer(value)
+    if value > 65535:
+        raise exceptions.InvalidArgument()
+    return value
+
+
+def _ionice(value):
+    if value not in throttle.IONICE_CLASSES:
+        raise exceptions.InvalidArgument()
+    return value
+
+
+SETTINGS = {  # setting : validator returning the parsed value
+    "address": _string,
+    "url": _string,
+    "debug": _boolean,
+    "store_path": _path,
+    "max_size": _max_size,
+    "min_free_size": _size,
+    "shard_size": _nonzero_size,
+    "workers": _workers,
+    "max_io_rate": _nonzero_size,
+    "nice": int,
+    "ionice": _ionice,
+    "connection_retry_limit": deserialize.positive_integer,
+    "connection_retry_delay": deserialize.positive_integer,
+    "metrics_port": _port,
+    "status_file": _path,
+}
+
+def validate(data, path="<config>"):
+    """Check the { profile : { setting : value, ... }, ... } of a config.
+    Returns: the profiles with parsed values, sizes as byte counts
+    """
+    if not isinstance(data, dict):
+        raise exceptions.InvalidConfig(path, "profiles must be an object")
+    profiles = {}
+    for profile, settings in data.items():
+        if not isinstance(settings, dict):
+            reason = "profile {0} must be an object".format(profile)
+            raise exceptions.InvalidConfig(path, reason)
+        profiles[profile] = {}
+        for name, value in settings.items():
+            if name not in SETTINGS:
+                reason = "unknown setting {0} in profile {1}".format(
+                    name, profile
+                )
+                raise exceptions.InvalidConfig(path, reason)
+            try:
+                profiles[profile][name] = SETTINGS[name](value)
+            except (ValueError, TypeError, AttributeError,
+                    exceptions.InvalidArgument):
+                reason = "invalid {0} {1} in profile {2}".format(
+                    name, json.dumps(value), profile
+                )
+                raise exceptions.InvalidConfig(path, reason)
+    return profiles
+
+
+def _profiles(path, required):
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except (IOError, OSError):
+        if required:
+            raise exceptions.InvalidConfig(path, "file not found")
+        return {}
+    except ValueError as e:
+        raise exceptions.InvalidConfig(path, e)
+    return validate(data, path)
+
+
+def load(path=None, profile=None):
+    """Settings of profile on top of the default profile.
+
+    Without path the config at DEFAULT_CONFIG_PATH is used if it exists.
+    Returns: { setting : value, ... }
+    """
+    profiles = _profiles(path or common.DEFAULT_CONFIG_PATH,
+                         required=path is not None)
+    profile = profile or common.DEFAULT_PROFILE
+    if profile != common.DEFAULT_PROFILE and profile not in profiles:
+        reason = "profile {0} not found".format(profile)
+        raise exceptions.InvalidConfig(path or common.DEFAULT_CONFIG_PATH,
+                                       reason)
+    settings = dict(profiles.get(common.DEFAULT_PROFILE, {}))
+    settings.update(profiles.get(profile, {}))
+    return settings
@@ -0,0 +1,154 @@
+import time
+import base64
+import socket
+
+from dataserv_client import common
+from dataserv_client import exceptions
+
+
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class Connection(object):
+    """Keep-alive connection to the farmer, not thread safe.
+
+    Like urlopen it uses the http_proxy and https_proxy environment
+    settings and follows redirects.
+    """
+
+    def __init__(self, url=common.DEFAULT_URL, debug=False,
+                 retry_limit=common.DEFAULT_CONNECTION_RETRY_LIMIT,
+                 retry_delay=common.DEFAULT_CONNECTION_RETRY_DELAY,
+                 metrics=None):
+        self.url = url
+        self.debug = debug
+        self.retry_limit = retry_limit
+        self.retry_delay = retry_delay
+        self.retry_after = None  # last back off hint from the server
+        self.metrics = metrics  # optional Metrics
+        self._http = None
+        self._origin = None  # (scheme, netloc) of the open connection
+        self._absolute = False  # plain http proxies want the full url
+        self._headers = {}
+        self._used = False
+
+    def _connect(self, url):
+        """Returns: (http connection, request target) for url."""
+        import urllib.parse
+        import urllib.request
+        from http.client import HTTPConnection, HTTPSConnection
+        parsed = urllib.parse.urlparse(url)
+        if self._origin != (parsed.scheme, parsed.netloc):
+            self.close()
+        if self._http is None:
+            https = parsed.scheme == "https"
+            connection = HTTPSConnection if https else HTTPConnection
+            proxy = urllib.request.getproxies().get(parsed.scheme)
+            if proxy and urllib.request.proxy_bypass(parsed.hostname or ""):
+                proxy = None
+            self._headers = {}
+            if proxy:
+                proxy = urllib.parse.urlparse(proxy)
+                proxy_headers = {}
+                if proxy.username:
+                    credentials = "{0}:{1}".format(
+                        urllib.parse.unquote(proxy.username),
+                        urllib.parse.unquote(proxy.password or "")
+                    )
+                    proxy_headers["Proxy-Authorization"] = "Basic " + (
+                        base64.b64encode(credentials.encode("utf-8"))
+                    ).decode("ascii")
+                self._http = connection(proxy.hostname, proxy.port)
+                if https:  # tunnel through the proxy with CONNECT
+                    self._http.set_tunnel(parsed.netloc,
+                                          headers=proxy_headers)
+                else:
+                    self._headers = proxy_headers
+                self._absolute = not https
+            else:
+                self._http = connection(parsed.netloc)
+                self._absolute = False
+            self._origin = (parsed.scheme, parsed.netloc)
+        if self._absolute:
+            return self._http, url
+        target = parsed.path or "/"
+        if parsed.query:
+            target += "?" + parsed.query
+        return self._http, target
+
+    def _get(self, url):
+        """GET url following redirects, returns the drained response."""
+        import urllib.parse
+        for redirect in range(MAX_REDIRECTS + 1):
+            http, target = self._connect(url)
+            http.request("GET", target, headers=self._headers)
+            response = http.getresponse()
+            response.read()  # drain so the connection can be reused
+            self._used = True
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_CODES or not location:
+                break
+            url = urllib.parse.urljoin(url, location)
+            if self.debug:
+                print("Redirected to: " + url)
+        return response  # too many redirects end as unexpected status
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        self._origin = None
+        self._used = False
+
+    def query(self, api_call, address=None, retries=0):
+        """GET api_call, returns True or raises for the address queried."""
+        from http.client import HTTPException
+        try:
+            if self.debug:
+                print("Query url: " + self.url + api_call)
+            response = self._get(self.url.rstrip("/") + api_call)
+            self.retry_after = self._parse_retry_after(response)
+        except (HTTPException, socket.error):
+            stale = self._used  # server closed the keep-alive
+            self.close()
+            if stale:
+                if self.metrics is not None:
+                    self.metrics.inc("reconnects_total")
+                return self.query(api_call, address, retries)
+            return self._handle_connection_error(api_call, address, retries)
+
+        if response.status == 200:
+            return True
+        elif response.status == 409:
+            raise exceptions.AddressAlreadyRegistered(address, self.url)
+        elif response.status == 404:
+            raise exceptions.FarmerNotFound(self.url)
+        elif response.status == 400:
+            raise exceptions.InvalidAddress(address)
+        elif response.status in (429, 503):
+            raise exceptions.FarmerBusy(self.url, self.retry_after)
+        elif response.status == 500:  # pragma: no cover
+            raise exceptions.FarmerError(self.url)  # pragma: no cover
+        import urllib.error  # pragma: no cover
+        raise urllib.error.HTTPError(  # pragma: no cover
+            self.url + api_call, response.status, response.reason,
+            response.msg, None
+        )
+
+    @staticmethod
+    def _parse_retry_after(response):
+        """Retry-After in seconds, http dates are not supported."""
+        value = response.getheader("Retry-After")
+        try:
+            return max(float(value), 0) if value else None
+        except ValueError:
+            return None
+
+    def _handle_connection_error(self, api_call, address, retries):
+        if retries >= self.retry_limit:
+            raise exceptions.ConnectionError(self.url)
+        if self.metrics is not None:
+            self.metrics.inc("connection_retries_total")
+        time.sleep(self.retry_delay)
+        return self.query(api_call, address, retries + 1)
@@ -1,39 +1,34 @@
+from dataserv_client import exceptions
 
-def byte_count(byte_count): # ugly but much faster and safer then regex
-    # FIXME handle parse errors
+
+_UNITS = {  # postfix : multiplier
+    'K': 1024 ** 1, 'M': 1024 ** 2, 'G': 1024 ** 3,
+    'T': 1024 ** 4, 'P': 1024 ** 5,
+    'KB': 1000 ** 1, 'MB': 1000 ** 2, 'GB': 1000 ** 3,
+    'TB': 1000 ** 4, 'PB': 1000 ** 5,
+}
+
+
+def byte_count(byte_count):  # much faster and safer then regex
+    """Returns: the bytes of an int or a string like 128M or 1GB, raises
+    ValueError if it can't be parsed."""
 
     # default value or python api used
     if isinstance(byte_count, int):
         return byte_count
 
-    def _get_byte_count(postfix, base, exponant):
-        char_num = len(postfix)
-        if byte_count[-char_num:] == postfix:
-            return int(byte_count[:-char_num]) * (base ** exponant)
-        return None
-
-    # check base 1024
-    if len(byte_count) > 1:
-        n = None
-        n = n if n is not None else _get_byte_count('K', 1024, 1)
-        n = n if n is not None else _get_byte_count('M', 1024, 2)
-        n = n if n is not None else _get_byte_count('G', 1024, 3)
-        n = n if n is not None else _get_byte_count('T', 1024, 4)
-        n = n if n is not None else _get_byte_count('P', 1024, 5)
-        if n is not None:
-            return n
-
-    # check base 1000
-    if len(byte_count) > 2:
-        n = None
-        n = n if n is not None else _get_byte_count('KB', 1000, 1)
-        n = n if n is not None else _get_byte_count('MB', 1000, 2)
-        n = n if n is not None else _get_byte_count('GB', 1000, 3)
-        n = n if n is not None else _get_byte_count('TB', 1000, 4)
-        n = n if n is not None else _get_byte_count('PB', 1000, 5)
-        if n is not None:
-            return n
-
+    number = byte_count.rstrip('KMGTPB')
+    postfix = byte_count[len(number):]
+    if postfix:
+        if postfix not in _UNITS:
+            raise ValueError("Invalid byte count {0}!".format(byte_count))
+        return int(number) * _UNITS[postfix]
     return int(byte_count)
 
 
+def positive_integer(number):
+    """Returns: int(number), raises InvalidArgument if it is negative."""
+    number = int(number)
+    if number < 0:
+        raise exceptions.InvalidArgument()
+    return number
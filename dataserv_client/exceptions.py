@@ -10,6 +10,13 @@ class InvalidArgument(DataservClientException):
         super(InvalidArgument, self).__init__("Invalid argument given!")
 
 
+class InvalidConfig(DataservClientException):
+
+    def __init__(self, path, reason):
+        msg = "Invalid config {0}: {1}!".format(path, reason)
+        super(InvalidConfig, self).__init__(msg)
+
+
 class AddressAlreadyRegistered(DataservClientException):
 
     def __init__(self, address, url):
@@ -31,6 +38,23 @@ class FarmerError(DataservClientException):
         super(FarmerError, self).__init__(msg)  # pragma: no cover
 
 
+class FarmerBusy(DataservClientException):
+
+    def __init__(self, url, retry_after=None):
+        self.retry_after = retry_after
+        msg = "Farmer at {0} busy, retry after {1} seconds!".format(
+            url, retry_after
+        )
+        super(FarmerBusy, self).__init__(msg)
+
+
+class AuditTimeout(DataservClientException):
+
+    def __init__(self, done, height, timeout):
+        msg = "Audit of {0} shards can't finish in {1} seconds, {2} done!"
+        super(AuditTimeout, self).__init__(msg.format(height, timeout, done))
+
+
 class InvalidAddress(DataservClientException):
 
     def __init__(self, address):
@@ -49,3 +73,9 @@ class ConnectionError(DataservClientException):
     def __init__(self, url):
         msg = "Could not connect to server {0}!".format(url)
         super(ConnectionError, self).__init__(msg)
+
+
+class BuildStopped(DataservClientException):
+
+    def __init__(self):
+        super(BuildStopped, self).__init__("Build stopped!")
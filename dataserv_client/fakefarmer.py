@@ -0,0 +1,146 @@
+import re
+import time
+import random
+import threading
+import urllib.parse
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+RESET = "reset"  # error_rates key to drop the connection without response
+_ADDRESS = re.compile(r"^[1-9A-HJ-NP-Za-km-z]{26,35}$")  # base58
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive like the real farmer
+
+    def do_GET(self):
+        farmer = self.server.farmer
+        if farmer.latency:
+            time.sleep(farmer.latency)
+        path = urllib.parse.urlparse(self.path).path  # proxies send urls
+        if farmer.redirect is not None:
+            farmer._increment_locked("redirect")
+            self.send_response(301)
+            self.send_header("Location", farmer.redirect + path)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        code = farmer._respond(path)
+        if code == RESET:
+            self.close_connection = True
+            return
+        self.send_response(code)
+        if farmer.retry_after is not None:
+            self.send_header("Retry-After", str(farmer.retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeFarmer(object):
+    """In-process stand-in for the register, ping and height api.
+
+    error_rates maps 409, 404, 400, 429, 500, 503 or RESET to the
+    probability that a request fails that way. If retry_after is set it is
+    sent as Retry-After header with every response. If redirect is set
+    every request is redirected to that url instead. Counters are kept per
+    call and per response.
+    """
+
+    def __init__(self, latency=0.0, error_rates=None, retry_after=None,
+                 seed=None, host="127.0.0.1", port=0, redirect=None):
+        self.latency = latency
+        self.redirect = redirect
+        self.error_rates = error_rates or {}
+        self.retry_after = retry_after
+        self.registered = set()
+        self.heights = {}
+        self.counters = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.farmer = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, key):
+        """Requests counted for a call name, response code or RESET."""
+        return self.counters.get(key, 0)
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters = {}
+
+    def _increment(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _increment_locked(self, key):
+        with self._lock:
+            self._increment(key)
+
+    def _injected_error(self):
+        roll = self._random.random()
+        for error, rate in sorted(self.error_rates.items(), key=str):
+            if roll < rate:
+                return error
+            roll -= rate
+        return None
+
+    def _respond(self, path):
+        parts = path.split("/")  # /api/<call>/<address>[/<height>]
+        with self._lock:
+            self._increment("requests")
+            code = self._injected_error()
+            if code is None:
+                code = self._handle(parts)
+            self._increment(parts[2] if len(parts) > 3 else "unknown")
+            self._increment(code)
+        return code
+
+    def _handle(self, parts):
+        if len(parts) < 4 or parts[1] != "api":
+            return 404
+        call, address = parts[2], parts[3]
+        if not _ADDRESS.match(address):
+            return 400
+        if call == "register":
+            if address in self.registered:
+                return 409
+            self.registered.add(address)
+            return 200
+        if address not in self.registered:
+            return 404
+        if call == "ping" and len(parts) == 4:
+            return 200
+        if call == "height" and len(parts) == 5 and parts[4].isdigit():
+            self.heights[address] = int(parts[4])
+            return 200
+        return 404
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+
+PREFIX = "dataserv_client_"
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0)
+
+
+class Histogram(object):
+    """Counts of observed seconds per bucket upper bound."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # not cumulative
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Metrics(object):
+    """Counters, gauges and histograms of a running node.
+
+    Served in the Prometheus text format by serve, and written as json to
+    status_file by write_status. Names get PREFIX prepended on output.
+    """
+
+    def __init__(self, status_file=None):
+        self.status_file = status_file
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one status writer at a time
+        self._server = None
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    def render(self):
+        """Returns: the metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append("# TYPE {0}{1} counter".format(PREFIX, name))
+                lines.append("{0}{1} {2}".format(PREFIX, name, value))
+            for name, value in sorted(self.gauges.items()):
+                lines.append("# TYPE {0}{1} gauge".format(PREFIX, name))
+                lines.append("{0}{1} {2}".format(PREFIX, name, value))
+            for name, histogram in sorted(self.histograms.items()):
+                name = PREFIX + name
+                lines.append("# TYPE {0} histogram".format(name))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('{0}_bucket{{le="{1}"}} {2}'.format(
+                        name, bound, cumulative
+                    ))
+                lines.append('{0}_bucket{{le="+Inf"}} {1}'.format(
+                    name, histogram.count
+                ))
+                lines.append("{0}_sum {1}".format(name, histogram.sum))
+                lines.append("{0}_count {1}".format(name, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def status(self):
+        """Returns: { "time" : .., "uptime" : .., "counters" : {..},
+        "gauges" : {..}, "histograms" : { name : { "count", "sum" } } }
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                "time": now,
+                "uptime": now - self._started,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": dict(
+                    (name, {"count": h.count, "sum": h.sum})
+                    for name, h in self.histograms.items()
+                ),
+            }
+
+    def write_status(self):
+        """Replace the status_file with the current status if one is set."""
+        if not self.status_file:
+            return
+        with self._write_lock:
+            directory = os.path.dirname(self.status_file) or "."
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(self.status(), fp)
+                if hasattr(os, "replace"):
+                    os.replace(tmp_path, self.status_file)
+                else:  # python 2
+                    if os.path.exists(self.status_file):
+                        os.remove(self.status_file)
+                    os.rename(tmp_path, self.status_file)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve render() over http in a daemon thread, returns the port."""
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,55 @@
+import time
+import hashlib
+
+
+# not affected by system clock changes, python 2 falls back to time.time
+monotonic = getattr(time, "monotonic", time.time)
+
+
+def jitter(key):
+    """Deterministic fraction in [0, 1) to spread nodes over a period."""
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) / float(16 ** 8)
+
+
+class Scheduler(object):
+    """Ticks at a fixed period on a monotonic clock.
+
+    The first tick is right away, later ticks are phase shifted by the
+    jitter of key so nodes started together do not keep pinging together.
+    Time spent between ticks does not add drift, and ticks never run past
+    the limit.
+    """
+
+    def __init__(self, period, limit=None, key=None, clock=monotonic):
+        self.period = float(period)
+        self.clock = clock
+        self.start = clock()
+        self.deadline = self.start + float(limit) if limit else None
+        self._next = self.start
+        if key:
+            self._next += jitter(key) * self.period
+
+    def expired(self):
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def wait(self, hint=None, sleep=time.sleep):
+        """Sleep until the next tick, or at least hint seconds if the
+        server asked to back off. Returns False once the limit is reached.
+        """
+        now = self.clock()
+        self._next += self.period
+        if self._next < now:  # skip missed ticks instead of bursting
+            if self.period > 0:
+                missed = int((now - self._next) / self.period) + 1
+                self._next += missed * self.period
+            else:
+                self._next = now
+        if hint:
+            self._next = max(self._next, now + hint)
+
+        if self.deadline is not None and self._next >= self.deadline:
+            sleep(max(self.deadline - now, 0))
+            return False
+        sleep(self._next - now)
+        return True
@@ -0,0 +1,68 @@
+import os
+import time
+
+from dataserv_client import exceptions
+
+
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+BURST_SECONDS = 10  # default seconds of idle time saved up for bursts
+
+
+class TokenBucket(object):
+    """Limit the bytes per second, tokens saved up while idle allow bursts
+    at full speed up to burst bytes."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate * BURST_SECONDS
+        self.tokens = self.burst
+        self.last = time.time()
+
+    def _refill(self):
+        now = time.time()
+        elapsed = max(now - self.last, 0)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.last = now
+
+    def consume(self, amount):
+        """Block until amount bytes may be used."""
+        self._refill()
+        self.tokens -= amount
+        if self.tokens < 0:  # wait until the debt is paid off
+            time.sleep(-self.tokens / float(self.rate))
+            self._refill()
+
+
+class ThrottledWriter(object):
+    """File like wrapper that passes writes through a TokenBucket, and
+    optionally through a hashlib hasher. Raises BuildStopped once the
+    optional stop event is set."""
+
+    def __init__(self, fp, bucket, hasher=None, stop=None):
+        self.fp = fp
+        self.bucket = bucket
+        self.hasher = hasher
+        self.stop = stop
+
+    def write(self, data):
+        if self.stop is not None and self.stop.is_set():
+            raise exceptions.BuildStopped()
+        self.bucket.consume(len(data))
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return self.fp.write(data)
+
+
+def lower_priority(nice=None, ionice=None, debug=False):
+    """Lower the cpu and io priority of the calling thread, on Linux only
+    threads started after the call inherit it."""
+    if nice is not None and hasattr(os, "nice"):
+        os.nice(int(nice))
+    if ionice is not None:
+        import subprocess
+        try:
+            subprocess.call(["ionice", "-c", IONICE_CLASSES[ionice],
+                             "-p", str(os.getpid())])
+        except OSError:  # not available on this platform
+            if debug:
+                print("Could not set io priority, ionice not found.")
@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import deque
+
+from dataserv_client import common
+
+
+class LatencyStats(object):
+    """Keeps the latest latency samples in seconds."""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()  # audits add while stats are read
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentiles(self, ranks=(50, 90, 99)):
+        """Returns: { rank : seconds, ... } or {} without samples."""
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return dict((rank, samples[min(len(samples) - 1,
+                                       len(samples) * rank // 100)])
+                    for rank in ranks)
+
+
+class Warmer(object):
+    """Prefetches shard metadata and first blocks into the page cache.
+
+    Uses posix_fadvise WILLNEED where available, spreading the memory
+    budget evenly over the shards. Audit latencies of the builder are
+    recorded as cold until the first pass completes and warm afterwards,
+    samples the builder already has count as cold.
+
+    Audits sample blocks at offsets derived from the challenge seed, so
+    prefetched data only covers about budget / store size of them. Most
+    of the gain is from the cached inodes and directory entries.
+    """
+
+    def __init__(self, builder, store_path, height,
+                 budget=common.DEFAULT_WARM_BUDGET,
+                 interval=common.DEFAULT_WARM_INTERVAL):
+        self.builder = builder
+        self.store_path = store_path
+        self.height = height
+        self.budget = budget
+        self.interval = interval
+        self.cold = builder.audit_stats
+        if self.cold is None:
+            self.cold = LatencyStats()
+        self.warm = LatencyStats()
+        self.builder.audit_stats = self.cold
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm_once(self):
+        """Prefetch every shard once, returns the bytes advised."""
+        per_shard = self.budget // self.height if self.height else 0
+        per_shard = min(per_shard, self.builder.shard_size)
+        advised = 0
+        for seed in self.builder.build_seeds(self.height):
+            if self._stop.is_set():
+                return advised
+            path = os.path.join(self.store_path, seed)
+            try:
+                fd = os.open(path, os.O_RDONLY)  # loads the inode
+            except OSError:  # missing shard
+                continue
+            try:
+                if per_shard and hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, 0, per_shard,
+                                     os.POSIX_FADV_WILLNEED)
+                    advised += per_shard
+            finally:
+                os.close(fd)
+        self.builder.audit_stats = self.warm
+        return advised
+
+    def _run(self):
+        self.warm_once()
+        while not self._stop.wait(self.interval):  # cache gets evicted
+            self.warm_once()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        """Returns: { "cold" : percentiles, "warm" : percentiles }"""
+        return {"cold": self.cold.percentiles(),
+                "warm": self.warm.percentiles()}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Measure how many requests per second the client sustains against the
+# in-process fake farmer. Builds use tiny shards, so their rate is
+# dominated by shard generation plus the one height report per build.
+# Usage: python -m tests.benchmark_load [seconds] [clients] [latency]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from dataserv_client import api
+from dataserv_client import fakefarmer
+
+
+ADDRESS_PREFIX = "1FwSLAJtpLrSQp94damzWY2nK5cE"  # valid base58 prefix
+BUILD_SHARDS = 4
+BUILD_SHARD_SIZE = 1024
+
+
+def _address(num):
+    digits = ""
+    for i in range(6):  # base58 has no 0, use base 9 digits 1-9
+        num, digit = divmod(num, 9)
+        digits += "123456789"[digit]
+    return ADDRESS_PREFIX + digits
+
+
+class _Quiet(object):
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+def _poll(client, seconds):
+    client.poll(delay=0, limit=seconds)
+
+
+def _build(client, seconds):
+    stop_time = time.time() + seconds
+    while time.time() < stop_time:
+        client.build(rebuild=True)
+
+
+def run(name, target, farmer, seconds, clients, **options):
+    """Run target for seconds on clients threads, print requests/s."""
+    store_path = tempfile.mkdtemp()
+    threads = []
+    farmer.reset_counters()
+    for i in range(clients):
+        address = _address(i)
+        client = api.Client(address, url=farmer.url,
+                            store_path=os.path.join(store_path, address),
+                            audit_cache_dir=store_path,
+                            connection_retry_limit=0, **options)
+        farmer.registered.add(address)
+        thread = threading.Thread(target=target, args=(client, seconds))
+        threads.append(thread)
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    shutil.rmtree(store_path)
+
+    requests = farmer.count("requests")
+    sys.__stdout__.write("{0:16} {1:8.1f} requests/s ({2} requests, {3} "
+                         "clients, {4:.1f}s)\n".format(
+                             name, requests / elapsed, requests, clients,
+                             elapsed))
+
+
+def main(seconds, clients, latency):
+    farmer = fakefarmer.FakeFarmer(latency=latency).start()
+    stdout, sys.stdout = sys.stdout, _Quiet()  # poll prints every ping
+    try:
+        run("poll", _poll, farmer, seconds, clients)
+        run("build", _build, farmer, seconds, clients,
+            max_size=BUILD_SHARDS * BUILD_SHARD_SIZE,
+            shard_size=BUILD_SHARD_SIZE)
+    finally:
+        sys.stdout = stdout
+        farmer.stop()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else 5,
+         int(args[1]) if len(args) > 1 else 1,
+         float(args[2]) if len(args) > 2 else 0.0)
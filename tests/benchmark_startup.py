@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Measure the wall time of short lived cli commands as run from cron.
+# Usage: python tests/benchmark_startup.py [runs]
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+ADDRESS = "1FwSLAJtpLrSQp94damzWY2nK5cEBugZfC"
+HEAVY_MODULES = ["RandomIO", "partialhash", "future", "dataserv_client.builder"]
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _command(args):
+    code = ("import sys; from dataserv_client import cli; cli.main({0}); "
+            "print([m for m in {1} if m in sys.modules], file=sys.stderr)")
+    return [sys.executable, "-c", code.format(repr(args), HEAVY_MODULES)]
+
+
+def measure(args, runs):
+    """Return the median wall time and the heavy modules loaded by args."""
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        process = subprocess.Popen(_command(args), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        timings.append(time.time() - start)
+        if process.returncode != 0:
+            raise Exception(err.decode("utf-8"))
+    timings.sort()
+    loaded = err.decode("utf-8").strip().splitlines()[-1]
+    return timings[len(timings) // 2], loaded
+
+
+def main(runs):
+    server = HTTPServer(("127.0.0.1", 0), _OkHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    store_path = tempfile.mkdtemp()
+    common = ["--store_path=" + store_path, "--address=" + ADDRESS,
+              "--url=http://127.0.0.1:{0}".format(server.server_port)]
+    try:
+        for command in ["version", "ping"]:
+            median, loaded = measure(common + [command], runs)
+            print("{0:8} {1:.3f}s median of {2} runs, heavy modules: "
+                  "{3}".format(command, median, runs, loaded))
+    finally:
+        server.shutdown()
+        os.rmdir(store_path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,10 @@
+import os
+
+
+def write_placeholder_shards(store_path, seeds, size=1024 * 8):
+    """Write small random shards for the seeds, for tests that only read
+    shards and don't need RandomIO to generate them."""
+    for seed in seeds:
+        with open(os.path.join(store_path, seed), "wb") as fp:
+            fp.write(os.urandom(size))
+    return seeds
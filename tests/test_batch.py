@@ -0,0 +1,86 @@
+import sys
+import json
+import unittest
+from dataserv_client import batch
+from dataserv_client import exceptions
+from dataserv_client.fakefarmer import FakeFarmer
+if sys.version_info[0] == 2:
+    from urllib2 import HTTPError
+else:
+    from urllib.error import HTTPError
+
+
+fixtures = json.load(open("tests/fixtures.json"))
+addresses = fixtures["addresses"]
+
+
+class TestBatchClient(unittest.TestCase):
+
+    def setUp(self):
+        self.farmer = FakeFarmer().start()
+        self.client = batch.BatchClient(url=self.farmer.url, workers=4,
+                                        connection_retry_limit=0)
+        self.addresses = sorted(addresses.values())
+
+    def tearDown(self):
+        self.client.close()
+        self.farmer.stop()
+
+    def test_register_ping_height(self):
+        results = self.client.register(self.addresses)
+        self.assertEqual(results, dict((a, True) for a in self.addresses))
+
+        results = self.client.ping(self.addresses)
+        self.assertEqual(results, dict((a, True) for a in self.addresses))
+
+        heights = dict((a, i) for i, a in enumerate(self.addresses))
+        results = self.client.height(heights)
+        self.assertEqual(results, dict((a, True) for a in self.addresses))
+        self.assertEqual(self.farmer.heights, heights)
+        self.assertEqual(self.farmer.count("requests"),
+                         len(self.addresses) * 3)
+
+    def test_per_address_outcomes(self):
+        alpha, beta, gamma = addresses["alpha"], addresses["beta"], \
+            addresses["gamma"]
+        self.client.register([alpha])
+        results = self.client.register([alpha, beta, "xyz"])
+        self.assertTrue(isinstance(results[alpha],
+                                   exceptions.AddressAlreadyRegistered))
+        self.assertTrue(results[beta])
+        self.assertTrue(isinstance(results["xyz"], exceptions.InvalidAddress))
+
+        results = self.client.ping([beta, gamma])
+        self.assertTrue(results[beta])
+        self.assertTrue(isinstance(results[gamma], exceptions.FarmerNotFound))
+
+    def test_connection_error(self):
+        client = batch.BatchClient(url="http://127.0.0.1:1",
+                                   connection_retry_limit=0)
+        try:
+            results = client.ping([addresses["alpha"]])
+        finally:
+            client.close()
+        self.assertTrue(isinstance(results[addresses["alpha"]],
+                                   exceptions.ConnectionError))
+
+    def test_unexpected_status(self):
+        farmer = FakeFarmer(error_rates={418: 1.0}).start()
+        client = batch.BatchClient(url=farmer.url, connection_retry_limit=0)
+        try:
+            results = client.ping([addresses["alpha"], addresses["beta"]])
+        finally:
+            client.close()
+            farmer.stop()
+        for address in (addresses["alpha"], addresses["beta"]):
+            self.assertTrue(isinstance(results[address], HTTPError))
+            self.assertEqual(results[address].code, 418)
+
+    def test_invalid_workers(self):
+        def callback():
+            batch.BatchClient(workers=0)
+        self.assertRaises(exceptions.InvalidArgument, callback)
+
+
+if __name__ == '__main__':
+    unittest.main()
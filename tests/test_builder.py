@@ -3,11 +3,18 @@ import time
 import json
 import random
 import shutil
+import hashlib
+import binascii
 import unittest
 import tempfile
+import threading
 import partialhash
 from datetime import datetime
 from dataserv_client.builder import Builder
+from dataserv_client.builder import BuildResult
+from dataserv_client import exceptions
+from dataserv_client import throttle
+from tests.shards import write_placeholder_shards
 
 my_shard_size = 1024*1024*128  # 128 MB
 my_max_size = 1024*1024*256  # 256 MB
@@ -80,6 +87,177 @@ class TestBuilder(unittest.TestCase):
             path = os.path.join(self.store_path, bucket.build_seed(shard_num))
             self.assertFalse(os.path.exists(path))
 
+    def test_build_seeds(self):
+        bucket = Builder(addresses["alpha"], 0, 0)  # emtpy bucket
+        seeds = bucket.build_seeds(4)
+        self.assertEqual(len(seeds), 4)
+        self.assertEqual(seeds[0], fixtures["test_build_seed"]["hash0"])
+        self.assertEqual(seeds[3], fixtures["test_build_seed"]["hash3"])
+
+    def test_builder_clean_max_size(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size * 2)
+        seeds = bucket.build_seeds(height * 2)
+
+        # create placeholder shards and an unrelated file
+        for seed in seeds + ["unrelated"]:
+            open(os.path.join(self.store_path, seed), "w").close()
+
+        # shrink to my_max_size
+        self.assertEqual(bucket.clean(self.store_path, my_max_size), height)
+        for shard_num, seed in enumerate(seeds):
+            path = os.path.join(self.store_path, seed)
+            self.assertEqual(os.path.exists(path), shard_num < height)
+
+        # clean everything else
+        self.assertEqual(bucket.clean(self.store_path), height)
+        self.assertEqual(os.listdir(self.store_path), ["unrelated"])
+
+    def test_stored_height(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size)
+        self.assertEqual(bucket.stored_height(self.store_path), 0)
+
+        seeds = bucket.build_seeds(3)
+        for seed in seeds:
+            open(os.path.join(self.store_path, seed), "w").close()
+        self.assertEqual(bucket.stored_height(self.store_path), 3)
+
+        # only consecutive shards count
+        os.remove(os.path.join(self.store_path, seeds[1]))
+        self.assertEqual(bucket.stored_height(self.store_path), 1)
+
+    def test_free_space(self):
+        self.assertTrue(Builder.free_space(self.store_path) > 0)
+
+    def test_build_stops_when_disk_full(self):
+        free = Builder.free_space(self.store_path)
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size,
+                         min_free_size=free)
+        generated = bucket.build(self.store_path, True, False)
+        self.assertEqual(generated, {})
+        self.assertEqual(os.listdir(self.store_path), [])
+
+    def test_builder_stop(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size)
+        bucket.stop()
+        self.assertEqual(bucket.build(self.store_path, True, False), {})
+        self.assertEqual(os.listdir(self.store_path), [])
+
+    def test_builder_stop_during_write(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size,
+                         throttle=throttle.TokenBucket(1024 * 1024, burst=0))
+        timer = threading.Timer(0.5, bucket.stop)
+        timer.start()
+        before = time.time()
+        self.assertEqual(bucket.build(self.store_path), {})
+        self.assertTrue(time.time() - before < 60)  # not the whole shard
+        self.assertEqual(os.listdir(self.store_path), [])  # no partial one
+
+    def test_hash_file_throttled(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size,
+                         throttle=throttle.TokenBucket(1024 * 1024, burst=0))
+        seed = bucket.build_seed(0)
+        data = os.urandom(1024 * 512)
+        with open(os.path.join(self.store_path, seed), "wb") as fp:
+            fp.write(data)
+
+        # existing shards are hashed through the throttle
+        before = time.time()
+        file_hash = bucket.generate_shard(seed, self.store_path)
+        self.assertTrue(time.time() - before >= 0.45)
+        self.assertEqual(file_hash, hashlib.sha256(data).hexdigest())
+
+    def test_seed_range(self):
+        bucket = Builder(addresses["alpha"], 0, 0)  # emtpy bucket
+        seeds = bucket.seed_range(2, 4)
+        self.assertEqual(len(seeds), 64)
+        self.assertEqual(binascii.hexlify(seeds[32:]).decode('utf-8'),
+                         fixtures["test_build_seed"]["hash3"])
+        self.assertEqual(bucket.seed_range(0, 4)[64:], seeds)
+
+    def test_seed_range_threads(self):
+        expected = Builder(addresses["alpha"], 0, 0).seed_range(0, 2000)
+        bucket = Builder(addresses["alpha"], 0, 0)
+        results = {}
+
+        def work(stop):
+            for i in range(1, stop, 97):
+                results.setdefault(stop, []).append(bucket.seed_range(0, i))
+
+        threads = [threading.Thread(target=work, args=(stop,))
+                   for stop in (500, 1000, 1500, 2000)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for seeds in sum(results.values(), []):
+            self.assertEqual(seeds, expected[:len(seeds)])
+        self.assertEqual(bucket.seed_range(0, 2000), expected)
+
+    def test_audit_range(self):
+        bucket = Builder(addresses["alpha"], my_shard_size, my_max_size)
+        seeds = bucket.build_seeds(3)
+        write_placeholder_shards(self.store_path, seeds)
+
+        digests = bucket.audit_range(b"storj", self.store_path, 1, 3)
+        self.assertEqual(len(digests), 64)
+        for i, seed in enumerate(seeds[1:]):
+            path = os.path.join(self.store_path, seed)
+            expected = partialhash.sample(path, 1024, sample_count=3,
+                                          seed=b"storj")
+            self.assertEqual(bytes(digests[i * 32:i * 32 + 32]), expected)
+
+        # full audit hashes the concatenated hex digests
+        audit_results = bucket.audit(b"storj", self.store_path, 3)
+        expected = hashlib.sha256(b"".join(audit_results)).hexdigest()
+        self.assertEqual(bucket.full_audit(b"storj", self.store_path, 3),
+                         expected)
+
+    def test_timed_audit(self):
+        bucket = Builder(addresses["alpha"], my_shard_size, my_max_size)
+        write_placeholder_shards(self.store_path, bucket.build_seeds(12))
+
+        # same hash as the untimed audit, progress reported per shard
+        progress = []
+        expected = bucket.full_audit(b"storj", self.store_path, 12)
+        result = bucket.full_audit(b"storj", self.store_path, 12, timeout=60,
+                                   on_progress=lambda *p: progress.append(p))
+        self.assertEqual(result, expected)
+        self.assertEqual(progress, [(i, 12) for i in range(1, 13)])
+
+        # fails after the probe once the projection exceeds the deadline
+        progress = []
+        bucket._sample = lambda seed, path: time.sleep(0.05) or b"0" * 32
+        self.assertRaises(exceptions.AuditTimeout, bucket.timed_audit,
+                          b"storj", self.store_path, 12, 0.55,
+                          on_progress=lambda *p: progress.append(p))
+        self.assertEqual(len(progress), 8)
+
+    def test_timed_audit_bounds_stat_pass(self):
+        bucket = Builder(addresses["alpha"], my_shard_size, my_max_size)
+        bucket.seed_range(0, 20000)  # warm seeds, only the stats are slow
+        progress = []
+        self.assertRaises(exceptions.AuditTimeout, bucket.full_audit,
+                          b"storj", self.store_path, 20000, timeout=0.001,
+                          on_progress=lambda *p: progress.append(p))
+        self.assertEqual(progress, [])
+
+    def test_iter_build(self):
+        bucket = Builder(addresses["delta"], my_shard_size, my_max_size * 2)
+        seeds = bucket.build_seeds(height * 2)
+        for seed in seeds:  # existing placeholder shards are only hashed
+            with open(os.path.join(self.store_path, seed), "wb") as fp:
+                fp.write(_to_bytes(seed))
+
+        shards = bucket.iter_build(self.store_path, start=1)
+        self.assertEqual(next(shards), (2, seeds[1], Builder.sha256(seeds[1])))
+        self.assertEqual([h for h, s, f in shards], [3, 4])
+
+        # cancel by closing the generator
+        shards = bucket.iter_build(self.store_path)
+        next(shards)
+        shards.close()
+        self.assertRaises(StopIteration, next, shards)
+
     def test_builder_audit(self):
         # generate shards for testing
         bucket = Builder(addresses["epsilon"], my_shard_size, my_max_size)
@@ -241,3 +419,50 @@ class TestBuilder(unittest.TestCase):
         for num in range(calls):
             height = on_generate_shard_called_with[num][0]
             self.assertEqual(num + 1, height)
+
+
+class TestBuildResult(unittest.TestCase):
+
+    def setUp(self):
+        self.shards = [(Builder.sha256(str(i)), Builder.sha256("h" + str(i)))
+                       for i in range(3)]
+        self.result = BuildResult(start=2)
+        for seed, file_hash in self.shards:
+            self.result.append(seed, file_hash)
+
+    def test_mapping(self):
+        self.assertEqual(len(self.result), 3)
+        self.assertEqual(list(self.result.keys()), [s for s, h in self.shards])
+        self.assertEqual(list(self.result.items()), self.shards)
+        self.assertEqual(self.result, dict(self.shards))
+        self.assertEqual(self.result[self.shards[1][0]], self.shards[1][1])
+        self.assertTrue(self.shards[2][0] in self.result)
+        self.assertFalse("xyz" in self.result)
+        self.assertRaises(KeyError, lambda: self.result[Builder.sha256("x")])
+        self.assertEqual(BuildResult(), {})
+
+    def test_views(self):
+        items, values = self.result.items(), self.result.values()
+        self.assertEqual(len(items), 3)
+        self.assertEqual(len(values), 3)
+        self.assertEqual(list(items), self.shards)
+        self.assertEqual(list(items), self.shards)  # not one-shot
+        self.assertEqual(list(values), [h for s, h in self.shards])
+        self.assertTrue(self.shards[0] in items)
+        self.assertTrue(self.shards[0][1] in values)
+
+    def test_heights(self):
+        heights = [(h, s, f) for h, s, f in self.result.heights()]
+        self.assertEqual(heights, [(n + 3, s, f) for n, (s, f)
+                                   in enumerate(self.shards)])
+
+    def test_save_load(self):
+        path = os.path.join(tempfile.mkdtemp(), "result")
+        try:
+            self.result.save(path)
+            self.assertEqual(os.path.getsize(path), 8 + 3 * 64)
+            loaded = BuildResult.load(path)
+            self.assertEqual(loaded.start, 2)
+            self.assertEqual(list(loaded.items()), self.shards)
+        finally:
+            shutil.rmtree(os.path.dirname(path))
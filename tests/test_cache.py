@@ -0,0 +1,131 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from dataserv_client.cache import AuditCache
+from dataserv_client.builder import Builder
+from tests.shards import write_placeholder_shards
+
+
+fixtures = json.load(open("tests/fixtures.json"))
+addresses = fixtures["addresses"]
+
+
+class TestAuditCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_path, "cache", "audit_cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_key(self):
+        self.assertEqual(AuditCache.key(b"storj", 0, 2, "abc"),
+                         AuditCache.key("storj", 0, 2, "abc"))
+        self.assertNotEqual(AuditCache.key(b"storj", 0, 2, "abc"),
+                            AuditCache.key(b"storj", 0, 3, "abc"))
+
+    def test_persisted(self):
+        cache = AuditCache(self.path)
+        self.assertEqual(cache.get("a"), None)
+        cache.put("a", "result")
+        self.assertEqual(cache.get("a"), "result")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # survives restarts
+        self.assertEqual(AuditCache(self.path).get("a"), "result")
+
+    def test_size_bounded(self):
+        cache = AuditCache(self.path, max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")  # b is now least recently used
+        cache.put("c", "3")
+        cache = AuditCache(self.path, max_entries=2)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.get("c"), "3")
+
+    def test_clear(self):
+        cache = AuditCache(self.path)
+        cache.put("a", "1")
+        cache.clear()
+        self.assertEqual(AuditCache(self.path).get("a"), None)
+
+    def test_corrupt_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as fp:
+            fp.write("not json")
+        self.assertEqual(AuditCache(self.path).get("a"), None)
+
+    def test_for_store(self):
+        directory = os.path.dirname(self.path)
+        first = AuditCache.for_store("/mnt/first", directory=directory)
+        second = AuditCache.for_store("/mnt/second", directory=directory)
+        self.assertNotEqual(first.path, second.path)
+        self.assertEqual(AuditCache.for_store("/mnt/first/",
+                                              directory=directory).path,
+                         first.path)
+
+        first.put("a", "result")
+        second.put("b", "result")
+        second.clear()
+        self.assertEqual(AuditCache(first.path).get("a"), "result")
+
+    def test_for_store_prunes(self):
+        directory = os.path.dirname(self.path)
+        paths = []
+        for i in range(4):
+            cache = AuditCache.for_store("/mnt/{0}".format(i),
+                                         directory=directory, max_stores=2)
+            cache.put("a", "result")
+            os.utime(cache.path, (i, i))  # written in order
+            paths.append(cache.path)
+        self.assertEqual(sorted(os.listdir(directory)),
+                         sorted(os.path.basename(p) for p in paths[2:]))
+
+    def test_save_leaves_no_tmp_files(self):
+        cache = AuditCache(self.path)
+        for i in range(3):
+            cache.put(str(i), "result")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ["audit_cache.json"])
+
+
+class TestBuilderAuditCache(unittest.TestCase):
+
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+        self.cache = AuditCache(os.path.join(self.store_path, "cache.json"))
+        self.builder = Builder(addresses["alpha"], 1024 * 8, 1024 * 16,
+                               audit_cache=self.cache)
+        self.seeds = self.builder.build_seeds(2)
+        write_placeholder_shards(self.store_path, self.seeds)
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path)
+
+    def test_hit(self):
+        expected = self.builder.full_audit(b"storj", self.store_path, 2)
+        self.assertEqual(self.builder.full_audit(b"storj", self.store_path,
+                                                 2, True), expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_changed_shard(self):
+        self.builder.full_audit(b"storj", self.store_path, 2)
+        with open(os.path.join(self.store_path, self.seeds[1]), "ab") as fp:
+            fp.write(b"bad data is bad")
+        self.builder.full_audit(b"storj", self.store_path, 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_clean_invalidates(self):
+        self.builder.full_audit(b"storj", self.store_path, 2)
+        self.builder.clean(self.store_path, max_size=1024 * 8)
+        with open(self.cache.path) as fp:
+            self.assertEqual(json.load(fp), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
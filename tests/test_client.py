@@ -1,5 +1,10 @@
+import os
 import json
 import time
+import sys
+import shutil
+import tempfile
+import subprocess
 import unittest
 import datetime
 from dataserv_client import cli
@@ -86,6 +91,26 @@ class TestClientPoll(AbstractTestSetup, unittest.TestCase):
         self.assertRaises(exceptions.AddressRequired, callback)
 
 
+class TestClientFarm(AbstractTestSetup, unittest.TestCase):
+
+    def test_farm(self):
+        store_path = tempfile.mkdtemp()
+        try:
+            client = api.Client(addresses["sigma"], url=url,
+                                store_path=store_path,
+                                max_size=1024*1024*256)  # 256MB
+            self.assertTrue(client.farm(register_address=True, delay=5,
+                                        limit=30))
+            self.assertEqual(len(os.listdir(store_path)), 2)
+        finally:
+            shutil.rmtree(store_path)
+
+    def test_address_required(self):
+        def callback():
+            api.Client().farm()
+        self.assertRaises(exceptions.AddressRequired, callback)
+
+
 class TestClientVersion(AbstractTestSetup, unittest.TestCase):
 
     def test_version(self):
@@ -93,6 +118,16 @@ class TestClientVersion(AbstractTestSetup, unittest.TestCase):
         self.assertEqual(client.version(), api.__version__)
 
 
+class TestLazyImports(unittest.TestCase):
+
+    def test_version_skips_builder(self):
+        code = ("import sys; from dataserv_client import cli; "
+                "cli.main(['version']); "
+                "assert 'dataserv_client.builder' not in sys.modules; "
+                "assert 'RandomIO' not in sys.modules")
+        self.assertEqual(subprocess.call([sys.executable, "-c", code]), 0)
+
+
 class TestInvalidArgument(AbstractTestSetup, unittest.TestCase):
 
     def test_invalid_retry_limit(self):
@@ -105,6 +140,21 @@ class TestInvalidArgument(AbstractTestSetup, unittest.TestCase):
             api.Client(connection_retry_delay=-1)
         self.assertRaises(exceptions.InvalidArgument, callback)
 
+    def test_invalid_min_free_size(self):
+        def callback():
+            api.Client(min_free_size=-1)
+        self.assertRaises(exceptions.InvalidArgument, callback)
+
+    def test_invalid_max_io_rate(self):
+        def callback():
+            api.Client(max_io_rate=0)
+        self.assertRaises(exceptions.InvalidArgument, callback)
+
+    def test_invalid_ionice(self):
+        def callback():
+            api.Client(ionice="fast")
+        self.assertRaises(exceptions.InvalidArgument, callback)
+
 
 class TestConnectionRetry(AbstractTestSetup, unittest.TestCase):
 
@@ -148,6 +198,39 @@ class TestClientBuild(AbstractTestSetup, unittest.TestCase):
         generated = client.build(cleanup=True)
         self.assertTrue(len(generated) == 4)
 
+    def test_build_resize(self):
+        store_path = tempfile.mkdtemp()
+        try:
+            client = api.Client(addresses["rho"], url=url,
+                                store_path=store_path,
+                                max_size=1024*1024*512)  # 512MB
+            client.register()
+            self.assertEqual(len(client.build()), 4)
+
+            # shrink deletes only the excess top heights
+            client = api.Client(addresses["rho"], url=url,
+                                store_path=store_path,
+                                max_size=1024*1024*256)  # 256MB
+            self.assertEqual(len(client.build()), 0)
+            self.assertEqual(len(os.listdir(store_path)), 2)
+
+            # grow generates only the new tail
+            client = api.Client(addresses["rho"], url=url,
+                                store_path=store_path,
+                                max_size=1024*1024*384)  # 384MB
+            self.assertEqual(len(client.build()), 1)
+            self.assertEqual(len(os.listdir(store_path)), 3)
+
+            # rebuild of a full disk keeps the stored height
+            free = client._get_builder().free_space(store_path)
+            client = api.Client(addresses["rho"], url=url,
+                                store_path=store_path, max_size="auto",
+                                min_free_size=free)
+            self.assertEqual(len(client.build(rebuild=True)), 3)
+            self.assertEqual(len(os.listdir(store_path)), 3)
+        finally:
+            shutil.rmtree(store_path)
+
     def test_address_required(self):
         def callback():
             api.Client().build()
@@ -178,6 +261,18 @@ class TestClientCliArgs(AbstractTestSetup, unittest.TestCase):
         args = ["--address=" + addresses["iota"], "--url=" + url, "ping"]
         self.assertTrue(cli.main(args))
 
+    def test_farm(self):
+        args = [
+            "--address=" + addresses["tau"],
+            "--url=" + url,
+            "--max_size=0",
+            "farm",
+            "--register_address",
+            "--delay=5",
+            "--limit=10"
+        ]
+        self.assertTrue(cli.main(args))
+
     def test_no_command_error(self):
         def callback():
             cli.main(["--address=" + addresses["lambda"]])
@@ -0,0 +1,78 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from dataserv_client import cli
+from dataserv_client import common
+from dataserv_client import config
+from dataserv_client import exceptions
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_path, "config.json")
+        self._write({
+            "default": {"url": "http://127.0.0.1:5000", "max_size": "2G",
+                        "connection_retry_limit": 3},
+            "fast": {"max_size": "auto", "max_io_rate": "10M",
+                     "shard_size": "64M", "workers": 16,
+                     "store_path": "~/store"},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def _write(self, data):
+        with open(self.path, "w") as fp:
+            json.dump(data, fp)
+
+    def test_default_profile(self):
+        self.assertEqual(config.load(self.path), {
+            "url": "http://127.0.0.1:5000", "max_size": 2 * 1024 ** 3,
+            "connection_retry_limit": 3,
+        })
+
+    def test_named_profile(self):
+        settings = config.load(self.path, "fast")
+        self.assertEqual(settings["url"], "http://127.0.0.1:5000")
+        self.assertEqual(settings["max_size"], common.AUTO_MAX_SIZE)
+        self.assertEqual(settings["max_io_rate"], 10 * 1024 ** 2)
+        self.assertEqual(settings["shard_size"], 64 * 1024 ** 2)
+        self.assertEqual(settings["workers"], 16)
+        self.assertEqual(settings["store_path"],
+                         os.path.expanduser("~/store"))
+
+    def test_missing(self):
+        missing = os.path.join(self.tmp_path, "missing.json")
+        self.assertRaises(exceptions.InvalidConfig, config.load, missing)
+        self.assertRaises(exceptions.InvalidConfig, config.load, self.path,
+                          "slow")
+
+    def test_invalid(self):
+        for data in ([], {"default": []}, {"default": {"size": 1}},
+                     {"default": {"max_size": "1X"}},
+                     {"default": {"workers": 0}},
+                     {"default": {"ionice": "fast"}},
+                     {"default": {"debug": "yes"}}):
+            self.assertRaises(exceptions.InvalidConfig, config.validate,
+                              data)
+
+    def test_cli_arguments_override_profile(self):
+        command, arguments = cli._parse_args([
+            "--config=" + self.path, "--profile=fast", "--max_size=1G",
+            "version"
+        ])
+        self.assertEqual(command, "version")
+        self.assertEqual(arguments["max_size"], "1G")
+        self.assertEqual(arguments["url"], "http://127.0.0.1:5000")
+        self.assertEqual(arguments["workers"], 16)
+        self.assertEqual(arguments["connection_retry_limit"], 3)
+        self.assertEqual(arguments["connection_retry_delay"],
+                         common.DEFAULT_CONNECTION_RETRY_DELAY)
+
+
+if __name__ == '__main__':
+    unittest.main()
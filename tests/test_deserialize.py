@@ -1,5 +1,6 @@
 import unittest
 from dataserv_client import deserialize
+from dataserv_client import exceptions
 
 
 class TestByteCount(unittest.TestCase):
@@ -57,6 +58,19 @@ class TestByteCount(unittest.TestCase):
         self.assertEqual(deserialize.byte_count("1PB"), 1 * (1000 ** 5))
         self.assertEqual(deserialize.byte_count("2PB"), 2 * (1000 ** 5))
 
+    def test_invalid_postfix(self):
+        for byte_count in ("K", "1X", "1KK", "1BB"):
+            self.assertRaises(ValueError, deserialize.byte_count, byte_count)
+
+
+class TestPositiveInteger(unittest.TestCase):
+
+    def test_positive_integer(self):
+        self.assertEqual(deserialize.positive_integer(0), 0)
+        self.assertEqual(deserialize.positive_integer("3"), 3)
+        self.assertRaises(exceptions.InvalidArgument,
+                          deserialize.positive_integer, -1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import shutil
+import threading
+import tempfile
+import unittest
+from dataserv_client import api
+from dataserv_client import exceptions
+from dataserv_client import fakefarmer
+from dataserv_client import schedule
+from dataserv_client import throttle
+
+
+fixtures = json.load(open("tests/fixtures.json"))
+addresses = fixtures["addresses"]
+
+
+class TestFakeFarmer(unittest.TestCase):
+
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path)
+
+    def _client(self, farmer, address):
+        return api.Client(address, url=farmer.url, store_path=self.store_path,
+                          connection_retry_limit=0, connection_retry_delay=0)
+
+    def test_register_and_ping(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            client = self._client(farmer, addresses["alpha"])
+            self.assertTrue(client.register())
+            self.assertTrue(client.ping())
+            self.assertRaises(exceptions.AddressAlreadyRegistered,
+                              client.register)
+            self.assertEqual(farmer.count("requests"), 3)
+            self.assertEqual(farmer.count("register"), 2)
+            self.assertEqual(farmer.count("ping"), 1)
+            self.assertEqual(farmer.count(200), 2)
+            self.assertEqual(farmer.count(409), 1)
+
+            farmer.reset_counters()
+            self.assertEqual(farmer.count("requests"), 0)
+
+    def test_invalid_address(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            client = self._client(farmer, "xyz")
+            self.assertRaises(exceptions.InvalidAddress, client.register)
+
+    def test_injected_errors(self):
+        with fakefarmer.FakeFarmer(error_rates={500: 1.0}) as farmer:
+            client = self._client(farmer, addresses["beta"])
+            self.assertRaises(exceptions.FarmerError, client.register)
+            self.assertEqual(farmer.count(500), 1)
+
+    def test_injected_reset(self):
+        error_rates = {fakefarmer.RESET: 1.0}
+        with fakefarmer.FakeFarmer(error_rates=error_rates) as farmer:
+            client = self._client(farmer, addresses["gamma"])
+            self.assertRaises(exceptions.ConnectionError, client.register)
+            self.assertEqual(farmer.count(fakefarmer.RESET), 1)
+
+    def test_latency(self):
+        with fakefarmer.FakeFarmer(latency=0.2) as farmer:
+            client = self._client(farmer, addresses["delta"])
+            before = time.time()
+            client.register()
+            self.assertTrue(time.time() - before >= 0.2)
+
+    def test_poll_honors_retry_after(self):
+        error_rates = {503: 1.0}
+        with fakefarmer.FakeFarmer(error_rates=error_rates,
+                                   retry_after=2) as farmer:
+            client = self._client(farmer, addresses["epsilon"])
+            before = time.time()
+            self.assertTrue(client.poll(delay=0, limit=3))
+            self.assertTrue(3 <= time.time() - before < 4)
+            self.assertEqual(farmer.count(503), 2)  # at 0 and 2 seconds
+
+    def test_poll_pings_before_jitter(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            client = self._client(farmer, addresses["alpha"])
+            jitter = schedule.jitter(addresses["alpha"]) * 4
+            self.assertTrue(jitter > 1)  # limit ends before the phase shift
+            self.assertTrue(client.poll(register_address=True, delay=4,
+                                        limit=1))
+            self.assertEqual(farmer.count("ping"), 1)
+
+            farmer.reset_counters()
+            client.max_size = 0  # nothing to build
+            self.assertTrue(client.farm(delay=4, limit=1))
+            self.assertEqual(farmer.count("ping"), 1)
+
+    def test_farm_lowers_priority_before_threads(self):
+        threads = []
+        lower_priority = throttle.lower_priority
+        throttle.lower_priority = lambda **kwargs: threads.append(
+            threading.current_thread()
+        )
+        try:
+            with fakefarmer.FakeFarmer() as farmer:
+                client = api.Client(addresses["iota"], url=farmer.url,
+                                    store_path=self.store_path, max_size=0,
+                                    nice=10)
+                self.assertTrue(client.farm(register_address=True, limit=1))
+        finally:
+            throttle.lower_priority = lower_priority
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_build_reports_height_once(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            client = api.Client(addresses["theta"], url=farmer.url,
+                                store_path=self.store_path,
+                                max_size=1024 * 10, shard_size=1024)
+            client.register()
+            self.assertEqual(len(client.build()), 10)
+            self.assertEqual(farmer.count("height"), 1)
+
+            # grow and shrink report only the final height too
+            for max_size in (1024 * 12, 1024 * 4):
+                farmer.reset_counters()
+                client.max_size = max_size
+                client.build()
+                self.assertEqual(farmer.count("height"), 1)
+            self.assertEqual(len(os.listdir(self.store_path)), 4)
+
+    def test_follows_redirects(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            with fakefarmer.FakeFarmer(redirect=farmer.url) as front:
+                client = self._client(front, addresses["zeta"])
+                self.assertTrue(client.register())
+                self.assertEqual(front.count("redirect"), 1)
+                self.assertEqual(farmer.count(200), 1)
+
+    def test_uses_http_proxy(self):
+        environ = dict(os.environ)
+        with fakefarmer.FakeFarmer() as proxy:
+            for name in ("no_proxy", "NO_PROXY"):
+                os.environ.pop(name, None)
+            os.environ["http_proxy"] = proxy.url
+            try:
+                client = api.Client(addresses["eta"],
+                                    url="http://farmer.invalid",
+                                    store_path=self.store_path,
+                                    connection_retry_limit=0)
+                self.assertTrue(client.register())
+            finally:
+                os.environ.clear()
+                os.environ.update(environ)
+            self.assertEqual(proxy.count(200), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+from dataserv_client import api
+from dataserv_client import exceptions
+from dataserv_client import fakefarmer
+from dataserv_client import metrics
+from dataserv_client.builder import Builder
+from tests.shards import write_placeholder_shards
+if sys.version_info[0] == 2:
+    from urllib2 import urlopen
+else:
+    from urllib.request import urlopen
+
+
+fixtures = json.load(open("tests/fixtures.json"))
+addresses = fixtures["addresses"]
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path)
+
+    def test_render(self):
+        node = metrics.Metrics()
+        node.inc("ping_total")
+        node.inc("ping_total", 2)
+        node.set("height", 7)
+        node.observe("ping_seconds", 0.02)
+        node.observe("ping_seconds", 2.0)
+        text = node.render()
+        self.assertIn("# TYPE dataserv_client_ping_total counter\n"
+                      "dataserv_client_ping_total 3\n", text)
+        self.assertIn("dataserv_client_height 7\n", text)
+        self.assertIn('dataserv_client_ping_seconds_bucket{le="0.01"} 0\n',
+                      text)
+        self.assertIn('dataserv_client_ping_seconds_bucket{le="0.05"} 1\n',
+                      text)
+        self.assertIn('dataserv_client_ping_seconds_bucket{le="+Inf"} 2\n',
+                      text)
+        self.assertIn("dataserv_client_ping_seconds_count 2\n", text)
+
+    def test_write_status(self):
+        path = os.path.join(self.store_path, "status", "status.json")
+        node = metrics.Metrics(status_file=path)
+        node.inc("ping_total")
+        node.observe("ping_seconds", 0.5)
+        node.write_status()
+        with open(path) as fp:
+            status = json.load(fp)
+        self.assertEqual(status["counters"], {"ping_total": 1})
+        self.assertEqual(status["histograms"]["ping_seconds"],
+                         {"count": 1, "sum": 0.5})
+
+    def test_write_status_threads(self):
+        path = os.path.join(self.store_path, "status.json")
+        node = metrics.Metrics(status_file=path)
+
+        def work():
+            for i in range(50):
+                node.inc("ping_total")
+                node.write_status()
+
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        node.write_status()
+        with open(path) as fp:
+            self.assertEqual(json.load(fp)["counters"], {"ping_total": 200})
+        self.assertEqual(os.listdir(self.store_path), ["status.json"])
+
+    def test_serve(self):
+        node = metrics.Metrics()
+        node.inc("ping_total")
+        port = node.serve(0)
+        try:
+            url = "http://127.0.0.1:{0}/metrics".format(port)
+            body = urlopen(url).read().decode("utf-8")
+        finally:
+            node.stop()
+        self.assertEqual(body, node.render())
+
+    def test_client_queries(self):
+        path = os.path.join(self.store_path, "status.json")
+        with fakefarmer.FakeFarmer() as farmer:
+            client = api.Client(addresses["alpha"], url=farmer.url,
+                                store_path=self.store_path,
+                                status_file=path, metrics_port=0)
+            client.register()
+            client.ping()
+            self.assertRaises(exceptions.AddressAlreadyRegistered,
+                              client.register)
+
+        counters = client.metrics.counters
+        self.assertEqual(counters["register_total"], 2)
+        self.assertEqual(counters["register_errors_total"], 1)
+        self.assertEqual(counters["ping_total"], 1)
+        self.assertEqual(client.metrics.histograms["ping_seconds"].count, 1)
+        with open(path) as fp:
+            self.assertEqual(json.load(fp)["counters"], counters)
+
+    def test_client_serves_while_polling(self):
+        with fakefarmer.FakeFarmer() as farmer:
+            client = api.Client(addresses["alpha"], url=farmer.url,
+                                store_path=self.store_path, metrics_port=0)
+            self.assertEqual(client.metrics_port, None)  # not for queries
+            client.register()
+            thread = threading.Thread(target=client.poll,
+                                      kwargs={"delay": 0.1, "limit": 2})
+            thread.start()
+            while client.metrics_port is None and thread.is_alive():
+                time.sleep(0.01)
+            url = "http://127.0.0.1:{0}/metrics".format(client.metrics_port)
+            body = urlopen(url).read().decode("utf-8")
+            thread.join()
+        self.assertIn("dataserv_client_register_total", body)
+        self.assertEqual(client.metrics_port, None)  # stopped afterwards
+        self.assertEqual(client.metrics._server, None)
+
+    def test_status_file_errors_keep_queries(self):
+        blocker = os.path.join(self.store_path, "blocker")
+        open(blocker, "w").close()  # not a directory
+        with fakefarmer.FakeFarmer() as farmer:
+            client = api.Client(addresses["alpha"], url=farmer.url,
+                                store_path=self.store_path,
+                                status_file=os.path.join(blocker, "s.json"))
+            self.assertTrue(client.register())
+        self.assertEqual(client.metrics.counters["register_total"], 1)
+
+    def test_invalid_metrics_port(self):
+        def callback():
+            api.Client(metrics_port=70000)
+        self.assertRaises(exceptions.InvalidArgument, callback)
+
+    def test_builder_audit(self):
+        node = metrics.Metrics()
+        bucket = Builder(addresses["alpha"], 0, 0, metrics=node)
+        write_placeholder_shards(self.store_path, bucket.build_seeds(3))
+        bucket.audit(b"storj", self.store_path, 3)
+        bucket.full_audit(b"storj", self.store_path, 3, timeout=60)
+        self.assertEqual(node.counters["audits_total"], 2)
+        self.assertEqual(node.counters["audit_shards_total"], 6)
+        self.assertEqual(node.histograms["audit_seconds"].count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
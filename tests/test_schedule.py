@@ -0,0 +1,80 @@
+import unittest
+from dataserv_client import schedule
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestJitter(unittest.TestCase):
+
+    def test_jitter(self):
+        self.assertEqual(schedule.jitter("alpha"), schedule.jitter("alpha"))
+        self.assertNotEqual(schedule.jitter("alpha"), schedule.jitter("beta"))
+        for key in ["alpha", "beta", "gamma", "delta"]:
+            self.assertTrue(0 <= schedule.jitter(key) < 1)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_fixed_period_despite_latency(self):
+        scheduler = schedule.Scheduler(10, clock=self.clock)
+        ticks = []
+        for i in range(4):
+            ticks.append(self.clock.now)
+            self.clock.now += 3  # ping latency
+            self.assertTrue(scheduler.wait(sleep=self.clock.sleep))
+        self.assertEqual(ticks, [1000.0, 1010.0, 1020.0, 1030.0])
+
+    def test_jitter_shifts_phase(self):
+        scheduler = schedule.Scheduler(10, key="alpha", clock=self.clock)
+        scheduler.wait(sleep=self.clock.sleep)
+        expected = 1010.0 + schedule.jitter("alpha") * 10
+        self.assertAlmostEqual(self.clock.now, expected)
+
+    def test_skips_missed_ticks(self):
+        scheduler = schedule.Scheduler(10, clock=self.clock)
+        self.clock.now += 25  # slow ping
+        scheduler.wait(sleep=self.clock.sleep)
+        self.assertEqual(self.clock.now, 1030.0)
+
+    def test_hint(self):
+        scheduler = schedule.Scheduler(10, clock=self.clock)
+        scheduler.wait(hint=45, sleep=self.clock.sleep)
+        self.assertEqual(self.clock.now, 1045.0)
+
+        # hints shorter than the period are ignored
+        scheduler.wait(hint=1, sleep=self.clock.sleep)
+        self.assertEqual(self.clock.now, 1055.0)
+
+    def test_limit(self):
+        scheduler = schedule.Scheduler(10, limit=25, clock=self.clock)
+        self.assertTrue(scheduler.wait(sleep=self.clock.sleep))
+        self.assertTrue(scheduler.wait(sleep=self.clock.sleep))
+        self.assertFalse(scheduler.expired())
+        self.assertFalse(scheduler.wait(sleep=self.clock.sleep))
+        self.assertEqual(self.clock.now, 1025.0)
+        self.assertTrue(scheduler.expired())
+
+    def test_zero_period(self):
+        scheduler = schedule.Scheduler(0, limit=1, clock=self.clock)
+        self.clock.now += 0.5
+        self.assertTrue(scheduler.wait(sleep=self.clock.sleep))
+        self.assertEqual(self.clock.sleeps, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import io
+import time
+import hashlib
+import unittest
+import threading
+from dataserv_client import exceptions
+from dataserv_client import throttle
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_runs_at_full_speed(self):
+        bucket = throttle.TokenBucket(1024, burst=4096)
+        before = time.time()
+        bucket.consume(4096)
+        self.assertTrue(time.time() - before < 0.1)
+
+    def test_limits_rate(self):
+        bucket = throttle.TokenBucket(1024 * 1024, burst=0)
+        before = time.time()
+        for i in range(4):
+            bucket.consume(1024 * 128)
+        self.assertTrue(time.time() - before >= 0.45)
+
+    def test_refills_while_idle(self):
+        bucket = throttle.TokenBucket(1024 * 1024, burst=1024 * 256)
+        bucket.consume(1024 * 256)
+        time.sleep(0.3)
+        before = time.time()
+        bucket.consume(1024 * 256)
+        self.assertTrue(time.time() - before < 0.1)
+
+
+class TestThrottledWriter(unittest.TestCase):
+
+    def test_write(self):
+        fp = io.BytesIO()
+        writer = throttle.ThrottledWriter(fp, throttle.TokenBucket(1024))
+        writer.write(b"storj")
+        self.assertEqual(fp.getvalue(), b"storj")
+
+    def test_write_hashes(self):
+        hasher = hashlib.sha256()
+        writer = throttle.ThrottledWriter(io.BytesIO(),
+                                          throttle.TokenBucket(1024), hasher)
+        writer.write(b"storj")
+        self.assertEqual(hasher.hexdigest(),
+                         hashlib.sha256(b"storj").hexdigest())
+
+    def test_write_stopped(self):
+        stop = threading.Event()
+        fp = io.BytesIO()
+        writer = throttle.ThrottledWriter(fp, throttle.TokenBucket(1024),
+                                          stop=stop)
+        writer.write(b"storj")
+        stop.set()
+        self.assertRaises(exceptions.BuildStopped, writer.write, b"storj")
+        self.assertEqual(fp.getvalue(), b"storj")
+
+
+if __name__ == '__main__':
+    unittest.main()
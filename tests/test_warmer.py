@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+from dataserv_client import api
+from dataserv_client import warmer
+from dataserv_client.builder import Builder
+from tests.shards import write_placeholder_shards
+
+
+fixtures = json.load(open("tests/fixtures.json"))
+addresses = fixtures["addresses"]
+
+
+class TestLatencyStats(unittest.TestCase):
+
+    def test_percentiles(self):
+        stats = warmer.LatencyStats()
+        self.assertEqual(stats.percentiles(), {})
+        for i in range(100):
+            stats.add(i / 1000.0)
+        self.assertEqual(stats.percentiles(), {50: 0.05, 90: 0.09, 99: 0.099})
+
+    def test_size(self):
+        stats = warmer.LatencyStats(size=2)
+        for i in range(3):
+            stats.add(i)
+        self.assertEqual(list(stats.samples), [1, 2])
+
+    def test_add_while_reading(self):
+        stats = warmer.LatencyStats()
+        thread = threading.Thread(
+            target=lambda: [stats.add(i) for i in range(100000)]
+        )
+        thread.start()
+        while thread.is_alive():
+            stats.percentiles()
+        thread.join()
+        self.assertEqual(len(stats.samples), 10000)
+
+
+class TestWarmer(unittest.TestCase):
+
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+        self.builder = Builder(addresses["alpha"], 1024 * 8, 1024 * 24)
+        self.seeds = self.builder.build_seeds(3)
+        write_placeholder_shards(self.store_path, self.seeds)
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path)
+
+    def test_warm_once(self):
+        os.remove(os.path.join(self.store_path, self.seeds[2]))
+        warm = warmer.Warmer(self.builder, self.store_path, 3,
+                             budget=1024 * 30)
+        advised = warm.warm_once()
+        if hasattr(os, "posix_fadvise"):
+            self.assertEqual(advised, 2 * 1024 * 8)  # capped at shard size
+        else:
+            self.assertEqual(advised, 0)
+
+    def test_stats(self):
+        warm = warmer.Warmer(self.builder, self.store_path, 3)
+        self.builder.audit(b"storj", self.store_path, 3)
+        warm.warm_once()
+        self.builder.audit(b"storj", self.store_path, 3)
+        self.assertEqual(len(warm.cold.samples), 3)
+        self.assertEqual(len(warm.warm.samples), 3)
+        self.assertEqual(sorted(warm.stats()), ["cold", "warm"])
+        self.assertEqual(sorted(warm.stats()["warm"]), [50, 90, 99])
+
+    def test_client_audits(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        client = api.Client(addresses["alpha"], store_path=self.store_path,
+                            shard_size=1024 * 8, audit_cache_dir=cache_dir)
+        client.audit(b"cold", 3)  # before warming
+        warm = client.warm(budget=1024 * 24)
+        while warm.builder.audit_stats is not warm.warm:  # first pass
+            time.sleep(0.01)
+        self.assertTrue(client.warm() is warm)
+        client.audit(b"warm", 3)
+        client.stop_warming()
+        self.assertEqual(len(warm.cold.samples), 3)
+        self.assertEqual(len(warm.warm.samples), 3)
+
+    def test_start_stop(self):
+        warm = warmer.Warmer(self.builder, self.store_path, 3, interval=0.01)
+        warm.start()
+        warm.stop()
+        self.assertFalse(warm._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()